@@ -47,6 +47,15 @@ class Config:
     PAGE_SIZE: int = 20  # pagination default
     MAX_UPLOAD_SIZE_MB: int = 200
 
+    # Thai Phrase Extraction
+    # Per-row triggers tax every table_cells insert; by default phrases are
+    # extracted by the batch sweep in scripts/integrate_phrase_extraction.py
+    PHRASE_EXTRACTION_TRIGGERS_ENABLED: bool = False
+    # Keep export_ready_corrections backed by a trigger-maintained counts table
+    # instead of grouping thai_phrases on every read; pays off only when the
+    # view is read far more often than phrases are written
+    PHRASE_CORRECTION_COUNTS_ENABLED: bool = False
+
     # Document Types
     VALID_DOCUMENT_TYPES: Tuple[str, ...] = (
         "BS",           # Balance Sheet
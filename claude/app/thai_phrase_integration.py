@@ -1,6 +1,11 @@
 
 # Thai Phrase Integration for Main App
 
+import sqlite3
+
+from app.config import config
+
+
 def extract_phrases_after_processing(document_id: int) -> dict:
     """Extract phrases after document processing is complete"""
     try:
@@ -16,14 +21,15 @@ def get_phrase_count_for_dashboard():
         conn = sqlite3.connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) FROM thai_phrases')
-        total = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM thai_phrases WHERE needs_correction = TRUE')
-        needs_review = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM thai_phrases WHERE status = "pending"')
-        pending = cursor.fetchone()[0]
+        # All three counts in a single pass over thai_phrases
+        cursor.execute("""
+            SELECT
+                COUNT(*),
+                COUNT(CASE WHEN needs_correction = TRUE THEN 1 END),
+                COUNT(CASE WHEN status = 'pending' THEN 1 END)
+            FROM thai_phrases
+        """)
+        total, needs_review, pending = cursor.fetchone()
 
         conn.close()
 
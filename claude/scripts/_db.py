@@ -0,0 +1,70 @@
+"""
+Shared SQLite helpers for the maintenance scripts.
+"""
+
+import functools
+import sqlite3
+
+from app.config import config
+
+# Connection settings for the write-heavy batch scripts: WAL journaling with
+# synchronous=NORMAL fsyncs only at checkpoints instead of on every commit.
+DEFAULT_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+)
+
+# Settings for read-only exports: map up to 2 GB of the file so sequential scans
+# skip the page-cache copy, and reject any accidental write.
+READ_ONLY_PRAGMAS = (
+    "query_only=ON",
+    "temp_store=MEMORY",
+    "mmap_size=2147483648",
+    "cache_size=-65536",
+)
+
+
+# Oldest SQLite library the scripts support: they use UPDATE ... FROM (3.33)
+# and MATERIALIZED CTEs (3.35) without fallbacks. Newer features stay optional
+# behind their own check (e.g. the STRICT rebuild in migrate_add_engine).
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+def tune_connection(conn, pragmas=DEFAULT_PRAGMAS):
+    """Apply performance PRAGMAs to a freshly opened sqlite3 connection"""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(
+            f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))}+ is required, "
+            f"found {sqlite3.sqlite_version}"
+        )
+    for pragma in pragmas:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+
+@functools.lru_cache(maxsize=1)
+def get_conn():
+    """Return the process-wide tuned connection to the prototype database
+
+    Scripts that run one after another in the same process share it, so the
+    PRAGMA setup is paid once and the page cache and mmap stay warm. Callers
+    commit their own work but must not close it.
+    """
+    return tune_connection(sqlite3.connect(config.DATABASE_PATH))
+
+
+def cell_keyed_phrase(phrase, cell):
+    """SQL condition that a table_cells phrase's source_id is the given cell's id
+
+    The cell trigger, the backlog sweep and ThaiPhraseExtractor key phrases by
+    table_cells.id and write a "Table <t>, Row <r>, Col <c>:" context, while
+    populate_thai_phrases keys them by extracted_tables.id with a "Row <r>, ..."
+    context. Matching the context against the cell tells the two apart.
+    """
+    return (
+        f"{phrase}.context LIKE 'Table ' || {cell}.extracted_table_id"
+        f" || ', Row ' || {cell}.row_index || ', Col ' || {cell}.col_index || ':%'"
+    )
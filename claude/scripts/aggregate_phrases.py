@@ -18,6 +18,27 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import config
 
+# Columns that are always int/float (or NULL) and never need CSV quoting
+NUMERIC_COLUMNS = frozenset({
+    'group_size', 'confidence_score', 'word_count', 'total_instances', 'best_phrase_id'
+})
+
+
+def write_csv(path, fieldnames, rows):
+    """Write dict rows to CSV, pre-formatting numeric columns as plain strings"""
+    numeric_flags = [name in NUMERIC_COLUMNS for name in fieldnames]
+
+    with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(fieldnames)
+        writer.writerows(
+            tuple(
+                ('' if row[name] is None else format(row[name])) if is_numeric else row[name]
+                for name, is_numeric in zip(fieldnames, numeric_flags)
+            )
+            for row in rows
+        )
+
 
 def aggregate_duplicate_phrases():
     """Aggregate duplicate phrases across documents to reduce review workload"""
@@ -229,28 +250,18 @@ def export_aggregated_phrases(aggregated_data, review_reduction_stats):
         'best_file_name', 'context', 'created_at', 'updated_at'
     ]
 
-    # Remove priority field from data for main export
-    clean_aggregated_data = [{k: v for k, v in row.items() if k != 'priority'} for row in aggregated_data]
-
-    with open(all_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in clean_aggregated_data:
-            writer.writerow(row)
+    # Rows are written by fieldname, so the priority field is left out of the main export
+    write_csv(all_path, fieldnames, aggregated_data)
 
     print(f"✅ Aggregated phrases exported to: {all_path}")
 
     # Export only phrases needing correction (much smaller file!)
-    needs_correction_data = [{k: v for k, v in row.items() if k != 'priority'} for row in aggregated_data if row['needs_correction']]
+    needs_correction_data = [row for row in aggregated_data if row['needs_correction']]
 
     review_filename = f"thai_phrases_aggregated_needs_review_{timestamp}.csv"
     review_path = exports_dir / review_filename
 
-    with open(review_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in needs_correction_data:
-            writer.writerow(row)
+    write_csv(review_path, fieldnames, needs_correction_data)
 
     print(f"📝 Review-only aggregated export: {review_path}")
 
@@ -270,11 +281,7 @@ def export_aggregated_phrases(aggregated_data, review_reduction_stats):
         }
     ]
 
-    with open(summary_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=['metric', 'value'])
-        writer.writeheader()
-        for row in summary_data:
-            writer.writerow(row)
+    write_csv(summary_path, ['metric', 'value'], summary_data)
 
     print(f"📊 Summary statistics exported to: {summary_path}")
 
@@ -355,11 +362,7 @@ def main():
                 'best_file_name', 'context'
             ]
 
-            with open(priority_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                for row in high_priority_data:
-                    writer.writerow({k: row[k] for k in fieldnames})
+            write_csv(priority_path, fieldnames, high_priority_data)
 
             print(f"⚡ High-priority review file: {priority_filename}")
 
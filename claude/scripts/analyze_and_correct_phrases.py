@@ -11,104 +11,152 @@ This script systematically analyzes Thai phrases from OCR results and:
 import sqlite3
 import re
 import sys
+import math
+import functools
+import multiprocessing
+from array import array
 from pathlib import Path
 from collections import defaultdict
 
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import config
+from scripts._db import tune_connection
 from utils.thai_utils import is_thai_text, clean_thai_text
 
+# OCR output repeats the same labels across documents, so memoize the text helpers
+@functools.lru_cache(maxsize=65536)
+def cached_clean_thai_text(text):
+    return clean_thai_text(text)
 
-class ThaiPhraseAnalyzer:
-    """Analyze Thai phrases and generate corrections"""
+
+@functools.lru_cache(maxsize=65536)
+def cached_is_thai_text(text):
+    return is_thai_text(text)
+
+
+# Three or more repeats of the same character (common OCR artifact)
+REPEATED_CHARS_PATTERN = re.compile(r'(.)\1{2,}')
+
+# Bit flag per issue type, in the order analyze_single_phrase reports them
+ISSUE_FLAGS = {
+    'missing_spaces': 1 << 0,
+    'zero_width_chars': 1 << 1,
+    'whitespace_issues': 1 << 2,
+    'number_formatting': 1 << 3,
+    'character_confusion': 1 << 4,
+    'unrecognized_content': 1 << 5,
+    'repeated_characters': 1 << 6,
+    'too_short': 1 << 7,
+}
+
+
+def issue_mask(issue_types):
+    """Pack a list of issue type names into a bit mask"""
+    mask = 0
+    for issue_type in issue_types:
+        mask |= ISSUE_FLAGS[issue_type]
+    return mask
+
+
+def issue_types_from_mask(mask):
+    """Unpack a bit mask into the list of issue type names"""
+    return [issue_type for issue_type, flag in ISSUE_FLAGS.items() if mask & flag]
+
+
+class CorrectionsNeeded:
+    """Problematic phrases stored as parallel columns instead of one dict per phrase"""
 
     def __init__(self):
-        self.conn = sqlite3.connect(config.DATABASE_PATH)
-        self.cursor = self.conn.cursor()
+        self.ids = array('q')
+        self.originals = []
+        self.suggestions = []
+        self.issue_masks = array('I')
+        self.confidences = array('d')  # NaN where the phrase has no confidence score
+        self.financial_terms = set()
+
+    def append(self, phrase_id, original, suggestion, issue_types, confidence, financial_terms):
+        self.ids.append(phrase_id)
+        self.originals.append(original)
+        self.suggestions.append(suggestion)
+        self.issue_masks.append(issue_mask(issue_types))
+        self.confidences.append(math.nan if confidence is None else confidence)
+        self.financial_terms.update(financial_terms)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        """Yield (id, original, suggestion, issue_mask) per phrase"""
+        return zip(self.ids, self.originals, self.suggestions, self.issue_masks)
+
+
+class PhraseQualityChecker:
+    """Detect OCR issues in Thai phrases; holds no database state so it can be built per worker"""
 
-        # Common OCR error patterns in Thai
-        self.correction_patterns = {
+    def __init__(self):
+        # Common OCR error patterns in Thai, as (compiled pattern, replacement, issue type)
+        self.correction_patterns = [(re.compile(pattern), replacement, issue_type) for pattern, replacement, issue_type in [
             # Character confusion patterns (examples - would need more comprehensive mapping)
-            # r'ค': 'ฮ',  # ค vs ฮ confusion
-            # r'ต': 'ถ',  # ต vs ถ confusion
-            # r'ป': 'ผ',  # ป vs ผ confusion
+            # (r'ค', 'ฮ', 'character_confusion'),  # ค vs ฮ confusion
+            # (r'ต', 'ถ', 'character_confusion'),  # ต vs ถ confusion
+            # (r'ป', 'ผ', 'character_confusion'),  # ป vs ผ confusion
 
             # Missing spaces between words
-            r'([ก-ฮ]{3,})([ก-ฮ]{3,})': r'\1 \2',  # Add space between long combined words
+            (r'([ก-ฮ]{3,})([ก-ฮ]{3,})', r'\1 \2', 'missing_spaces'),  # Add space between long combined words
 
             # Common OCR artifacts
-            r'[\u200B-\u200D\ufeff]': '',  # Remove zero-width characters
-            r'\s+': ' ',  # Normalize whitespace
-            r'^\s+|\s+$': '',  # Trim leading/trailing spaces
+            (r'[\u200B-\u200D\ufeff]', '', 'zero_width_chars'),  # Remove zero-width characters
+            (r'\s{2,}|[^\S ]', ' ', 'whitespace_issues'),  # Normalize whitespace runs and tabs/newlines
+            (r'^\s+|\s+$', '', 'whitespace_issues'),  # Trim leading/trailing spaces
 
             # Number formatting issues
-            r'([0-9])\s+([0-9])': r'\1\2',  # Combine separated numbers
+            (r'([0-9])\s+([0-9])', r'\1\2', 'number_formatting'),  # Combine separated numbers
 
             # Date format corrections
-            r'(\d{2})[\/\-\.](\d{2})[\/\-\.](\d{4})': r'\1/\2/\3',  # Normalize date format
-        }
+            (r'(\d{2})[\/\-\.](\d{2})[\/\-\.](\d{4})', r'\1/\2/\3', 'number_formatting'),  # Normalize date format
+        ]]
+
+        # Any of the patterns above; clean phrases (the majority) fail this in one scan
+        self.defect_pattern = re.compile('|'.join(
+            f'(?:{pattern.pattern})' for pattern, _, _ in self.correction_patterns
+        ))
 
         # Financial terms that commonly appear in these documents
-        self.financial_terms = [
+        self.financial_terms = (
             'สินทรัพย์', 'สินทรัพย์หมุนเวียน', 'สินทรัพย์ไม่หมุนเวียน',
             'เงินสด', 'ลูกหนี', 'เจ้าหนี', 'หนีสิน', 'งบดุล', 'งบแสดง',
             'กำไร', 'ขาดทุน', 'สะสม', 'บริษัท', 'ผู้ถือหุ้น', 'ทุน',
             'ภาษีเงินได้', 'ค่าใช้จ่าย', 'รายได้', 'รายจ่าย',
             'ที่ดิน', 'อาคาร', 'อุปกรณ์', 'เงินลงทุนระยะยาว',
             'เงินให้กู้ยืม', 'ดอกเบี้ยจ่าย', 'งบบริษัท', 'ผู้ตรวจสอบบัญชี'
-        ]
+        )
 
-    def analyze_phrase_quality(self):
-        """Analyze all phrases and identify quality issues"""
+        # Single alternation over all terms, longest first so the most specific term wins
+        self.financial_terms_pattern = re.compile('|'.join(
+            re.escape(term) for term in sorted(self.financial_terms, key=len, reverse=True)
+        ))
 
-        print("🔍 Analyzing Thai phrase quality...")
-
-        # Get all phrases
-        self.cursor.execute('''
-            SELECT id, phrase, confidence_score, word_count, status, needs_correction
-            FROM thai_phrases
-            ORDER BY id
-        ''')
-
-        phrases = self.cursor.fetchall()
-
-        quality_issues = []
-        corrections_needed = []
-
-        for phrase_id, phrase, confidence, word_count, status, needs_correction in phrases:
-            issues = []
-
-            if not phrase or not is_thai_text(phrase.strip()):
-                issues.append("empty_or_invalid")
-                continue
-
-            # Check for common OCR errors
-            phrase_analysis = self.analyze_single_phrase(phrase)
-
-            if phrase_analysis['has_issues']:
-                issues.extend(phrase_analysis['issue_types'])
-                corrections_needed.append({
-                    'id': phrase_id,
-                    'original': phrase,
-                    'issues': issues,
-                    'suggested_correction': phrase_analysis['suggested_correction'],
-                    'issue_types': phrase_analysis['issue_types'],
-                    'confidence': confidence
-                })
-
-        print(f"📊 Analysis complete:")
-        print(f"   Total phrases analyzed: {len(phrases)}")
-        print(f"   Phrases needing corrections: {len(corrections_needed)}")
-
-        return corrections_needed
+        # Match all financial terms in a single pass when pyahocorasick is installed
+        self.term_automaton = None
+        if AHOCORASICK_AVAILABLE:
+            self.term_automaton = ahocorasick.Automaton()
+            for term in self.financial_terms:
+                self.term_automaton.add_word(term, term)
+            self.term_automaton.make_automaton()
 
     def analyze_single_phrase(self, phrase):
         """Analyze a single phrase for OCR issues"""
 
         original_phrase = phrase
-        cleaned_phrase = clean_thai_text(phrase)
+        cleaned_phrase = cached_clean_thai_text(phrase)
         suggested_correction = phrase
         issue_types = []
         has_issues = False
@@ -122,27 +170,18 @@ class ThaiPhraseAnalyzer:
                 'confidence': 0.1
             }
 
-        # Apply correction patterns
-        for pattern, replacement in self.correction_patterns.items():
-            if re.search(pattern, phrase):
-                suggested_correction = re.sub(pattern, replacement, phrase)
-                if pattern.startswith(r'([\u200B-\u200D\ufeff]'):
-                    issue_types.append('zero_width_chars')
-                elif pattern.startswith(r'\s+'):
-                    issue_types.append('whitespace_issues')
-                elif pattern.startswith(r'([ก-ฮ]{2,})'):
-                    issue_types.append('missing_spaces')
-                elif pattern.startswith(r'([0-9])'):
-                    issue_types.append('number_formatting')
-                else:
-                    issue_types.append('character_confusion')
-                has_issues = True
+        # Apply correction patterns cumulatively; a pattern is an issue only if it changed the text
+        if self.defect_pattern.search(suggested_correction):
+            for pattern, replacement, issue_type in self.correction_patterns:
+                corrected = pattern.sub(replacement, suggested_correction)
+                if corrected != suggested_correction:
+                    suggested_correction = corrected
+                    if issue_type not in issue_types:
+                        issue_types.append(issue_type)
+                    has_issues = True
 
         # Check for financial term matching
-        found_financial_terms = []
-        for term in self.financial_terms:
-            if term in suggested_correction:
-                found_financial_terms.append(term)
+        found_financial_terms = self.find_financial_terms(suggested_correction)
 
         # If phrase contains no recognizable financial terms, flag it
         if not found_financial_terms and len(cleaned_phrase) > 5:
@@ -150,8 +189,8 @@ class ThaiPhraseAnalyzer:
             has_issues = True
 
         # Check for repeated characters (common OCR artifact)
-        if re.search(r'(.)\1{2,}', suggested_correction):
-            suggested_correction = re.sub(r'(.)\1{2,}', r'\1\1', suggested_correction)
+        if REPEATED_CHARS_PATTERN.search(suggested_correction):
+            suggested_correction = REPEATED_CHARS_PATTERN.sub(r'\1\1', suggested_correction)
             issue_types.append('repeated_characters')
             has_issues = True
 
@@ -165,54 +204,183 @@ class ThaiPhraseAnalyzer:
             'financial_terms': found_financial_terms
         }
 
+    def find_financial_terms(self, text):
+        """Return the distinct financial terms contained in text"""
+
+        if self.term_automaton is not None:
+            return list(dict.fromkeys(term for _, term in self.term_automaton.iter(text)))
+
+        return list(dict.fromkeys(self.financial_terms_pattern.findall(text)))
+
+    def check_phrase(self, row):
+        """Return (id, phrase, suggestion, issue_types, confidence, financial_terms) for a
+        problematic (id, phrase, confidence) row, or None if the phrase needs no correction"""
+
+        phrase_id, phrase, confidence = row
+
+        if not phrase or not cached_is_thai_text(phrase.strip()):
+            return None
+
+        # Check for common OCR errors
+        phrase_analysis = self.analyze_single_phrase(phrase)
+
+        if not phrase_analysis['has_issues']:
+            return None
+
+        return (
+            phrase_id,
+            phrase,
+            phrase_analysis['suggested_correction'],
+            phrase_analysis['issue_types'],
+            confidence,
+            phrase_analysis.get('financial_terms', [])
+        )
+
+
+# Rows per fetch from the phrase cursor, and rows per task sent to a worker
+ANALYSIS_BATCH_SIZE = 16384
+WORKER_CHUNK_SIZE = 1024
+
+_worker_checker = None
+
+
+def _init_worker():
+    """Pool initializer: build the patterns and term automaton once per worker process"""
+    global _worker_checker
+    _worker_checker = PhraseQualityChecker()
+
+
+def _check_phrase(row):
+    return _worker_checker.check_phrase(row)
+
+
+class ThaiPhraseAnalyzer(PhraseQualityChecker):
+    """Analyze Thai phrases and generate corrections"""
+
+    def __init__(self):
+        super().__init__()
+        self.conn = tune_connection(sqlite3.connect(config.DATABASE_PATH))
+        self.cursor = self.conn.cursor()
+
+    def analyze_phrase_quality(self, processes=1):
+        """Analyze all phrases and identify quality issues
+
+        Phrase analysis is CPU-bound and independent per phrase, so large runs
+        can fan it out to a process pool (processes=None uses every CPU); the
+        default runs it inline. All database writes stay in this process.
+        """
+
+        print("🔍 Analyzing Thai phrase quality...")
+
+        # Stream all phrases straight from the cursor instead of materializing them
+        self.cursor.execute('''
+            SELECT id, phrase, confidence_score
+            FROM thai_phrases
+            ORDER BY id
+        ''')
+
+        total_phrases = 0
+        corrections_needed = CorrectionsNeeded()
+
+        # sqlite3 objects are bound to this thread, so rows are fetched here in
+        # batches and only the plain tuples are handed to the pool. The workers
+        # are spawned, not forked, so none inherits this process's open
+        # connection handle.
+        pool = None
+        if processes != 1:
+            pool = multiprocessing.get_context('spawn').Pool(processes, initializer=_init_worker)
+
+        # Bind hot lookups to locals for the per-batch loop
+        fetch_rows = self.cursor.fetchmany
+        check_phrase = self.check_phrase
+        add_correction = corrections_needed.append
+
+        try:
+            while True:
+                rows = fetch_rows(ANALYSIS_BATCH_SIZE)
+                if not rows:
+                    break
+                total_phrases += len(rows)
+
+                if pool:
+                    results = pool.imap(_check_phrase, rows, chunksize=WORKER_CHUNK_SIZE)
+                else:
+                    results = map(check_phrase, rows)
+
+                for result in results:
+                    if result:
+                        add_correction(*result)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        print(f"📊 Analysis complete:")
+        print(f"   Total phrases analyzed: {total_phrases}")
+        print(f"   Phrases needing corrections: {len(corrections_needed)}")
+
+        return corrections_needed
+
     def generate_corrections_batch(self, corrections_needed):
         """Generate corrections for phrases that need them"""
 
         print("🔧 Generating corrections for problematic phrases...")
 
-        corrections_generated = 0
+        # Covering index so loading the active pairs reads only index pages
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_thai_ocr_corrections_active_pair
+            ON thai_ocr_corrections(is_active, error_pattern, correction)
+        ''')
+
+        # Load existing dictionary entries once instead of probing per phrase
+        self.cursor.execute('''
+            SELECT error_pattern, correction FROM thai_ocr_corrections
+            WHERE is_active = 1
+        ''')
+        existing = set(self.cursor.fetchall())
 
-        for correction_data in corrections_needed:
-            phrase_id = correction_data['id']
-            suggested_correction = correction_data['suggested_correction']
-            issue_types = correction_data['issue_types']
+        insert_rows = []
+        update_rows = []
 
-            if suggested_correction and suggested_correction != correction_data['original']:
-                # Check if this correction already exists in dictionary
-                self.cursor.execute('''
-                    SELECT id FROM thai_ocr_corrections
-                    WHERE error_pattern = ? AND correction = ? AND is_active = 1
-                ''', (correction_data['original'], suggested_correction))
+        for phrase_id, original, suggested_correction, mask in corrections_needed:
+            if suggested_correction and suggested_correction != original:
+                key = (original, suggested_correction)
 
-                if not self.cursor.fetchone():
-                    # Add to corrections table
+                if key not in existing:
+                    existing.add(key)
+                    issue_types = issue_types_from_mask(mask)
                     correction_type = self.determine_correction_type(issue_types)
 
-                    self.cursor.execute('''
-                        INSERT INTO thai_ocr_corrections
-                        (error_pattern, correction, type, confidence, frequency, description,
-                         example, priority, is_active, created_at, updated_at)
-                        VALUES (?, ?, ?, 0.9, 0, ?, ?, 'high', TRUE, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    ''', (
-                        correction_data['original'],
+                    insert_rows.append((
+                        original,
                         suggested_correction,
                         correction_type,
                         f"Auto-generated correction for: {', '.join(issue_types)}",
-                        f"{correction_data['original']} → {suggested_correction}"
+                        f"{original} → {suggested_correction}"
                     ))
+                    print(f"   ✅ Added correction: {original[:30]}... → {suggested_correction[:30]}...")
+
+                update_rows.append((suggested_correction, phrase_id))
 
-                    corrections_generated += 1
-                    print(f"   ✅ Added correction: {correction_data['original'][:30]}... → {suggested_correction[:30]}...")
+        self.cursor.execute('BEGIN')
 
-                # Update phrase record
-                self.cursor.execute('''
-                    UPDATE thai_phrases
-                    SET needs_correction = TRUE,
-                        correction_suggestion = ?,
-                        status = 'reviewed',
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (suggested_correction, phrase_id))
+        self.cursor.executemany('''
+            INSERT INTO thai_ocr_corrections
+            (error_pattern, correction, type, confidence, frequency, description,
+             example, priority, is_active, created_at, updated_at)
+            VALUES (?, ?, ?, 0.9, 0, ?, ?, 'high', TRUE, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ''', insert_rows)
+
+        self.cursor.executemany('''
+            UPDATE thai_phrases
+            SET needs_correction = TRUE,
+                correction_suggestion = ?,
+                status = 'reviewed',
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', update_rows)
+
+        corrections_generated = len(insert_rows)
 
         self.conn.commit()
         print(f"🎉 Generated {corrections_generated} new corrections")
@@ -279,28 +447,28 @@ class ThaiPhraseAnalyzer:
 
         # Issue type distribution
         issue_counts = defaultdict(int)
-        for correction in corrections_needed:
-            for issue_type in correction['issue_types']:
+        for mask in corrections_needed.issue_masks:
+            for issue_type in issue_types_from_mask(mask):
                 issue_counts[issue_type] += 1
 
         print(f"📈 Issue Type Distribution:")
         for issue_type, count in sorted(issue_counts.items(), key=lambda x: x[1], reverse=True):
             print(f"   {issue_type}: {count}")
 
+        scored = [c for c in corrections_needed.confidences if not math.isnan(c)]
+
         print(f"\n📋 Summary:")
         print(f"   Total problematic phrases: {len(corrections_needed)}")
-        print(f"   Average phrase confidence: {sum(c['confidence'] for c in corrections_needed) / len(corrections_needed):.3f}" if corrections_needed else "N/A")
+        print(f"   Average phrase confidence: {sum(scored) / len(scored):.3f}" if scored else "N/A")
 
         # Sample corrections
         print(f"\n💡 Sample Corrections:")
-        for i, correction in enumerate(corrections_needed[:10]):
-            print(f"   {i+1}. {correction['original'][:40]}... → {correction['suggested_correction'][:40]}...")
+        samples = zip(corrections_needed.originals[:10], corrections_needed.suggestions[:10])
+        for i, (original, suggestion) in enumerate(samples):
+            print(f"   {i+1}. {original[:40]}... → {(suggestion or original)[:40]}...")
 
         print(f"\n📝 Financial Terms Found:")
-        financial_terms_found = set()
-        for correction in corrections_needed:
-            analysis = self.analyze_single_phrase(correction['original'])
-            financial_terms_found.update(analysis.get('financial_terms', []))
+        financial_terms_found = corrections_needed.financial_terms
 
         for term in sorted(financial_terms_found):
             print(f"   ✓ {term}")
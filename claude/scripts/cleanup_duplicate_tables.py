@@ -7,45 +7,60 @@ and deletes older duplicates. Intended to be safe to run repeatedly.
 """
 
 import sqlite3
+import sys
 from pathlib import Path
 
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scripts._db import tune_connection
+
 DB_PATH = Path(__file__).parent.parent / "data" / "prototype.db"
 
 
+def ensure_indexes(conn):
+    """Create the covering index used to group tables by document/table_index."""
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_extracted_tables_dup
+        ON extracted_tables(document_id, table_index, id)
+        """
+    )
+
+
 def find_duplicates(conn):
-    """Return list of (document_id, table_index, ids_to_delete)."""
+    """Return list of (document_id, table_index, duplicate_count)."""
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT document_id, table_index, GROUP_CONCAT(id) AS ids, COUNT(*) AS cnt
+        SELECT document_id, table_index, COUNT(*) - 1 AS duplicate_count
         FROM extracted_tables
         GROUP BY document_id, table_index
-        HAVING cnt > 1
+        HAVING COUNT(*) > 1
         """
     )
-    duplicates = []
-    for doc_id, table_idx, ids_csv, cnt in cur.fetchall():
-        ids = [int(x) for x in ids_csv.split(",") if x]
-        # keep the newest row (highest id), delete the rest
-        ids_to_delete = sorted(ids)[:-1]
-        if ids_to_delete:
-            duplicates.append((doc_id, table_idx, ids_to_delete))
-    return duplicates
+    return cur.fetchall()
 
 
 def cleanup(conn, duplicates):
     cur = conn.cursor()
-    total_deleted = 0
-    for doc_id, table_idx, ids in duplicates:
-        placeholders = ",".join("?" for _ in ids)
-        cur.execute(
-            f"DELETE FROM extracted_tables WHERE id IN ({placeholders})",
-            ids,
-        )
-        total_deleted += cur.rowcount
+    for doc_id, table_idx, duplicate_count in duplicates:
         print(
-            f"Document {doc_id}, table_index {table_idx}: deleted {cur.rowcount} duplicate row(s)"
+            f"Document {doc_id}, table_index {table_idx}: deleting {duplicate_count} duplicate row(s)"
         )
+
+    # keep the newest row (highest id) per group and delete the rest in one pass
+    cur.execute("BEGIN")
+    cur.execute(
+        """
+        DELETE FROM extracted_tables
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM extracted_tables
+            GROUP BY document_id, table_index
+        )
+        """
+    )
+    total_deleted = cur.rowcount
     conn.commit()
     return total_deleted
 
@@ -55,8 +70,9 @@ def main():
         print(f"Database not found at {DB_PATH}")
         return
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = tune_connection(sqlite3.connect(DB_PATH))
     try:
+        ensure_indexes(conn)
         duplicates = find_duplicates(conn)
         if not duplicates:
             print("No duplicate tables found.")
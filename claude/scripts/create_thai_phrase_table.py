@@ -7,6 +7,7 @@ These phrases can be reviewed and incorrect ones can be added to the custom dict
 """
 
 import sqlite3
+import re
 from datetime import datetime
 import sys
 from pathlib import Path
@@ -15,6 +16,23 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import config
+from scripts._db import tune_connection
+
+# Thai Unicode block and the punctuation used to split cell text into phrases
+THAI_PATTERN = re.compile(r'[\u0E00-\u0E7F]')
+PHRASE_SPLIT_PATTERN = re.compile(r'[,\.;:()\[\]{}]+')
+
+# Rows buffered per executemany call when populating thai_phrases
+INSERT_BATCH_SIZE = 10000
+# Rows fetched per round trip when streaming table_cells
+READ_BATCH_SIZE = 4096
+
+
+def has_thai(value):
+    """SQL function: 1 if the value contains Thai characters, else 0"""
+    if value is None:
+        return 0
+    return 1 if THAI_PATTERN.search(value if isinstance(value, str) else str(value)) else 0
 
 
 def create_thai_phrase_table(db_path: str = None):
@@ -24,7 +42,7 @@ def create_thai_phrase_table(db_path: str = None):
         db_path = config.DATABASE_PATH
 
     try:
-        conn = sqlite3.connect(db_path)
+        conn = tune_connection(sqlite3.connect(db_path))
         cursor = conn.cursor()
 
         # Create thai_phrases table
@@ -67,6 +85,25 @@ def create_thai_phrase_table(db_path: str = None):
             CREATE INDEX IF NOT EXISTS idx_thai_phrases_needs_correction ON thai_phrases(needs_correction)
         ''')
 
+        # Partial indexes matching the status-update predicates in analyze_and_correct_phrases.py
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tp_has_suggestion ON thai_phrases(id)
+            WHERE correction_suggestion IS NOT NULL AND correction_suggestion != ''
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tp_pending_high_conf ON thai_phrases(status, confidence_score, word_count)
+            WHERE status = 'pending'
+        ''')
+
+        # Expression index matching the ORDER BY in export_phrases_with_corrections.py,
+        # so the export walks the index instead of sorting every phrase
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tp_export_order ON thai_phrases(
+                (CASE WHEN needs_correction = 1 THEN 1 ELSE 2 END), confidence_score, id
+            )
+        ''')
+
         # Create table for phrase correction history
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS phrase_corrections (
@@ -108,7 +145,7 @@ def populate_thai_phrases_from_existing_data():
     """Populate thai_phrases table with existing Thai text from OCR results"""
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = tune_connection(sqlite3.connect(config.DATABASE_PATH))
         cursor = conn.cursor()
 
         # Check if we already have data
@@ -122,62 +159,71 @@ def populate_thai_phrases_from_existing_data():
         print("🔄 Extracting Thai phrases from existing OCR data...")
 
         # Extract Thai phrases from table_cells
-        cursor.execute('''
-            SELECT value, extracted_table_id, confidence_score, row_index, col_index
-            FROM table_cells
-            WHERE value IS NOT NULL
-            AND LENGTH(TRIM(value)) > 0
-            ORDER BY extracted_table_id, row_index, col_index
+        # Join the owning document up front instead of looking it up per cell,
+        # and drop non-Thai cells inside SQLite before they reach Python
+        conn.create_function('has_thai', 1, has_thai, deterministic=True)
+
+        insert_sql = '''
+            INSERT OR IGNORE INTO thai_phrases
+            (phrase, source_table, source_id, document_id, confidence_score,
+             context, word_count, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
+        '''
+        pending_rows = []
+        changes_before = conn.total_changes
+
+        # Run the whole population as one explicit write transaction
+        cursor.execute('BEGIN IMMEDIATE')
+
+        # Stream cells through a separate read cursor in fixed-size batches
+        cell_cursor = conn.execute('''
+            SELECT tc.value, tc.extracted_table_id, tc.confidence_score, tc.row_index, tc.col_index,
+                   et.document_id
+            FROM table_cells tc
+            LEFT JOIN extracted_tables et ON et.id = tc.extracted_table_id
+            WHERE tc.value IS NOT NULL
+            AND LENGTH(TRIM(tc.value)) > 0
+            AND has_thai(tc.value)
+            ORDER BY tc.extracted_table_id, tc.row_index, tc.col_index
         ''')
 
-        cell_results = cursor.fetchall()
-        phrases_added = 0
+        # Bind hot lookups to locals for the per-cell loop
+        split_phrases = PHRASE_SPLIT_PATTERN.split
+        thai_search = THAI_PATTERN.search
+        queue_row = pending_rows.append
 
-        for value, table_id, confidence, row, col in cell_results:
-            # Check if text contains Thai characters
-            if any(ord(char) >= 3584 for char in str(value)):
-                # Get document ID for this table
-                cursor.execute('''
-                    SELECT document_id FROM extracted_tables
-                    WHERE id = ?
-                ''', (table_id,))
-                doc_result = cursor.fetchone()
-                document_id = doc_result[0] if doc_result else None
-
-                # Split into potential phrases (basic splitting by spaces and punctuation)
-                thai_phrases = []
-                import re
+        while True:
+            cell_results = cell_cursor.fetchmany(READ_BATCH_SIZE)
+            if not cell_results:
+                break
 
-                # Basic Thai phrase extraction
-                candidate_phrases = re.split(r'[,\.;:()\[\]{}]+', str(value))
+            for value, table_id, confidence, row, col, document_id in cell_results:
+                text = value if isinstance(value, str) else str(value)
+                context = f"Row {row}, Col {col}: {text[:50]}..."
 
-                for phrase in candidate_phrases:
+                # Split into potential phrases (basic splitting by spaces and punctuation)
+                # and queue the Thai ones for batched insertion
+                for phrase in split_phrases(text):
                     phrase = phrase.strip()
-                    if len(phrase) > 2 and any(ord(char) >= 3584 for char in phrase):
-                        thai_phrases.append(phrase)
-
-                # Insert unique phrases
-                for phrase in thai_phrases:
-                    word_count = len(phrase.split())
-
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO thai_phrases
-                        (phrase, source_table, source_id, document_id, confidence_score,
-                         context, word_count, status)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
-                    ''', (
-                        phrase,
-                        'table_cells',
-                        table_id,
-                        document_id,
-                        confidence,
-                        f"Row {row}, Col {col}: {str(value)[:50]}...",
-                        word_count
-                    ))
-
-                    if cursor.rowcount > 0:
-                        phrases_added += 1
-
+                    if len(phrase) > 2 and thai_search(phrase):
+                        queue_row((
+                            phrase,
+                            'table_cells',
+                            table_id,
+                            document_id,
+                            confidence,
+                            context,
+                            len(phrase.split())
+                        ))
+
+            if len(pending_rows) >= INSERT_BATCH_SIZE:
+                cursor.executemany(insert_sql, pending_rows)
+                pending_rows.clear()
+
+        if pending_rows:
+            cursor.executemany(insert_sql, pending_rows)
+
+        phrases_added = conn.total_changes - changes_before
         conn.commit()
         print(f"✅ Added {phrases_added} Thai phrases to the database")
 
@@ -210,12 +256,15 @@ def create_dictionary_management_view():
     """Create a view for dictionary management"""
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = tune_connection(sqlite3.connect(config.DATABASE_PATH))
         cursor = conn.cursor()
 
+        # SQLite has no CREATE OR REPLACE VIEW, so drop and recreate
+        cursor.execute('DROP VIEW IF EXISTS dictionary_management')
+
         # Create view that joins phrases with corrections
         cursor.execute('''
-            CREATE OR REPLACE VIEW dictionary_management AS
+            CREATE VIEW dictionary_management AS
             SELECT
                 tp.id as phrase_id,
                 tp.phrase,
@@ -235,11 +284,22 @@ def create_dictionary_management_view():
             FROM thai_phrases tp
             LEFT JOIN extracted_tables et ON tp.source_id = et.id
             LEFT JOIN documents d ON tp.document_id = d.id
-            LEFT JOIN companies c ON d.company_id = c.id
+            LEFT JOIN fiscal_years fy ON d.fiscal_year_id = fy.id
+            LEFT JOIN companies c ON fy.company_id = c.id
             LEFT JOIN phrase_corrections tc ON tp.id = tc.phrase_id AND tc.is_active = 1
             ORDER BY tp.created_at DESC
         ''')
 
+        # Let the view's ORDER BY walk an index instead of sorting, and its
+        # phrase_corrections join use a real index instead of an automatic one
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_thai_phrases_created_at ON thai_phrases(created_at)
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_phrase_corrections_phrase ON phrase_corrections(phrase_id, is_active)
+        ''')
+
         conn.commit()
         print("✅ Dictionary management view created successfully")
 
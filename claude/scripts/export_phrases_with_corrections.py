@@ -9,6 +9,9 @@ to facilitate manual review and correction workflow.
 import sqlite3
 import sys
 import csv
+import codecs
+import gzip
+import io
 from pathlib import Path
 from datetime import datetime
 
@@ -16,17 +19,72 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import config
+from scripts._db import READ_ONLY_PRAGMAS, tune_connection
 
 
-def export_phrases_with_corrections():
-    """Export all Thai phrases with correction information to CSV"""
+# Column order of the phrase exports (complete and review-only)
+PHRASE_FIELDNAMES = [
+    'phrase_id', 'original_phrase', 'word_count', 'confidence_score', 'status',
+    'needs_correction', 'correction_suggestion', 'final_correction', 'correction_source',
+    'context', 'company_name', 'company_name_en', 'file_name', 'created_at', 'updated_at'
+]
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+DICTIONARY_FIELDNAMES = ['error_pattern', 'correction', 'type', 'priority', 'confidence', 'frequency', 'created_at']
+
+# Large write buffer so the CSV module's small writes are flushed in few syscalls
+CSV_BUFFER_SIZE = 1 << 20
+
+# Rows fetched per round trip while streaming the phrase query: at ~200 bytes a row
+# this keeps each batch around 2 MB while amortising the per-call overhead
+FETCH_BATCH_SIZE = 10000
+
+# Fast gzip level for --gzip exports: most of the size win on repetitive Thai text
+# at a fraction of the CPU of the default level 9
+GZIP_LEVEL = 1
+
+
+def open_csv(path, compress=False):
+    """Open a UTF-8 (BOM) CSV file for writing with a large buffer
+
+    The BOM is written once up front so the text layer can use the plain utf-8
+    codec instead of the stateful utf-8-sig one. With compress=True the file is
+    gzipped on the fly at GZIP_LEVEL.
+    """
+    if compress:
+        raw = io.BufferedWriter(gzip.open(path, 'wb', compresslevel=GZIP_LEVEL), CSV_BUFFER_SIZE)
+    else:
+        raw = open(path, 'wb', buffering=CSV_BUFFER_SIZE)
+    raw.write(codecs.BOM_UTF8)
+    return io.TextIOWrapper(raw, encoding='utf-8', newline='')
+
+
+def write_csv(path, header, rows, compress=False):
+    """Write header and positional rows to a CSV file in one writerows call"""
+    with open_csv(path, compress) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def iter_batches(cursor, size=FETCH_BATCH_SIZE):
+    """Yield lists of rows from an executed cursor in fetchmany batches instead of fetchall()"""
+    cursor.arraysize = size
+    while (batch := cursor.fetchmany()):
+        yield batch
+
+
+def export_phrases_with_corrections(compress=False):
+    """Export all Thai phrases with correction information to CSV (gzipped if compress)"""
+
+    conn = tune_connection(sqlite3.connect(config.DATABASE_PATH), READ_ONLY_PRAGMAS)
 
     try:
         print("📊 Exporting Thai phrases with corrections...")
 
-        # Get all phrases with their correction information
+        # Get all phrases with their correction information, in PHRASE_FIELDNAMES order.
+        # The dictionary match and the final correction/source are resolved inside SQLite;
+        # when several active corrections share a pattern, the last one in the reference
+        # CSV ordering (priority, frequency DESC) is used.
         query = '''
             SELECT
                 tp.id,
@@ -36,13 +94,31 @@ def export_phrases_with_corrections():
                 tp.status,
                 tp.needs_correction,
                 tp.correction_suggestion,
+                CASE
+                    WHEN oc.id IS NOT NULL THEN oc.correction
+                    WHEN tp.correction_suggestion != '' THEN tp.correction_suggestion
+                END as final_correction,
+                CASE
+                    WHEN oc.id IS NOT NULL THEN 'dictionary_' || oc.type
+                    WHEN tp.correction_suggestion != '' THEN 'phrase_suggestion'
+                    WHEN tp.needs_correction THEN 'needs_manual_review'
+                    ELSE 'no_correction_needed'
+                END as correction_source,
                 tp.context,
-                tp.created_at,
-                tp.updated_at,
-                d.file_name,
                 c.name_th as company_name,
-                c.name_en as company_name_en
+                c.name_en as company_name_en,
+                d.file_name,
+                tp.created_at,
+                tp.updated_at
             FROM thai_phrases tp
+            LEFT JOIN thai_ocr_corrections oc ON oc.id = (
+                SELECT o.id
+                FROM thai_ocr_corrections o
+                WHERE o.error_pattern = tp.phrase
+                AND o.is_active = 1
+                ORDER BY o.priority DESC, o.frequency ASC, o.id DESC
+                LIMIT 1
+            )
             LEFT JOIN documents d ON tp.document_id = d.id
             LEFT JOIN fiscal_years fy ON d.fiscal_year_id = fy.id
             LEFT JOIN companies c ON fy.company_id = c.id
@@ -53,8 +129,18 @@ def export_phrases_with_corrections():
         '''
 
         cursor = conn.cursor()
-        cursor.execute(query)
-        phrases = cursor.fetchall()
+
+        # Read counts, corrections and phrases from one snapshot
+        cursor.execute('BEGIN')
+
+        # Count phrases up front in SQL so the stream below needs no bookkeeping
+        cursor.execute('''
+            SELECT
+                COUNT(*) as total,
+                COUNT(CASE WHEN needs_correction THEN 1 END) as needs_correction
+            FROM thai_phrases
+        ''')
+        total_phrases, needs_correction_count = cursor.fetchone()
 
         # Get dictionary corrections for reference
         corrections_query = '''
@@ -74,115 +160,39 @@ def export_phrases_with_corrections():
         cursor.execute(corrections_query)
         corrections = cursor.fetchall()
 
-        print(f"📈 Found {len(phrases)} total phrases")
-
-        # Count phrases needing correction
-        needs_correction_count = sum(1 for phrase in phrases if phrase[5])  # needs_correction is index 5
+        print(f"📈 Found {total_phrases} total phrases")
         print(f"🔧 {needs_correction_count} phrases marked for correction")
         print(f"📚 {len(corrections)} dictionary corrections available")
 
-        # Create a dictionary mapping for fast lookups
-        correction_map = {correction[0]: correction for correction in corrections}
-
-        # Create comprehensive export data
-        export_data = []
-        needs_review_data = []
-
-        for phrase in phrases:
-            (phrase_id, phrase_text, word_count, confidence_score, status, needs_correction,
-             correction_suggestion, context, created_at, updated_at, file_name,
-             company_name, company_name_en) = phrase
-
-            # Try to find exact match in dictionary corrections
-            dict_correction = correction_map.get(phrase_text)
-
-            # Determine final correction and source
-            if dict_correction:
-                final_correction = dict_correction[1]  # correction text
-                correction_source = f"dictionary_{dict_correction[2]}"  # type
-            elif correction_suggestion:
-                final_correction = correction_suggestion
-                correction_source = 'phrase_suggestion'
-            elif needs_correction:
-                final_correction = None
-                correction_source = 'needs_manual_review'
-            else:
-                final_correction = None
-                correction_source = 'no_correction_needed'
-
-            export_row = {
-                'phrase_id': phrase_id,
-                'original_phrase': phrase_text,
-                'word_count': word_count,
-                'confidence_score': confidence_score,
-                'status': status,
-                'needs_correction': needs_correction,
-                'correction_suggestion': correction_suggestion,
-                'final_correction': final_correction,
-                'correction_source': correction_source,
-                'context': context,
-                'company_name': company_name,
-                'company_name_en': company_name_en,
-                'file_name': file_name,
-                'created_at': created_at,
-                'updated_at': updated_at
-            }
-
-            export_data.append(export_row)
-
-            # Also add to review-only list if it needs correction
-            if needs_correction:
-                needs_review_data.append(export_row)
-
-        # Generate output filename
+        # Generate output filenames in the exports directory, created once
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        export_dir = config.EXPORTS_PATH
+        export_dir.mkdir(parents=True, exist_ok=True)
 
-        # Export all phrases
-        csv_filename = f"data/exports/thai_phrases_corrections_{timestamp}.csv"
-        csv_path = Path(config.PROJECT_ROOT) / csv_filename
-        csv_path.parent.mkdir(parents=True, exist_ok=True)
-
-        fieldnames = list(export_data[0].keys()) if export_data else []
-
-        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in export_data:
-                writer.writerow(row)
+        suffix = '.csv.gz' if compress else '.csv'
+        csv_path = export_dir / f"thai_phrases_corrections_{timestamp}{suffix}"
+        review_path = export_dir / f"thai_phrases_needs_review_{timestamp}{suffix}"
+        dict_path = export_dir / f"dictionary_corrections_{timestamp}{suffix}"
 
-        print(f"✅ Complete CSV exported to: {csv_path}")
+        # Stream phrases into the complete export and the review-only export in one pass
+        cursor.execute(query)
 
-        # Export only phrases needing correction
-        review_filename = f"data/exports/thai_phrases_needs_review_{timestamp}.csv"
-        review_path = Path(config.PROJECT_ROOT) / review_filename
+        with open_csv(csv_path, compress) as csvfile, open_csv(review_path, compress) as reviewfile:
+            writer = csv.writer(csvfile)
+            review_writer = csv.writer(reviewfile)
+            writer.writerow(PHRASE_FIELDNAMES)
+            review_writer.writerow(PHRASE_FIELDNAMES)
 
-        with open(review_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in needs_review_data:
-                writer.writerow(row)
+            # Hand whole batches to the C writer; review rows are filtered per batch
+            for batch in iter_batches(cursor):
+                writer.writerows(batch)
+                review_writer.writerows([row for row in batch if row[5]])  # needs_correction
 
+        print(f"✅ Complete CSV exported to: {csv_path}")
         print(f"📝 Review-only CSV exported to: {review_path}")
 
         # Export dictionary corrections reference
-        dict_filename = f"data/exports/dictionary_corrections_{timestamp}.csv"
-        dict_path = Path(config.PROJECT_ROOT) / dict_filename
-
-        dict_fieldnames = ['error_pattern', 'correction', 'type', 'priority', 'confidence', 'frequency', 'created_at']
-
-        with open(dict_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=dict_fieldnames)
-            writer.writeheader()
-            for correction in corrections:
-                writer.writerow({
-                    'error_pattern': correction[0],
-                    'correction': correction[1],
-                    'type': correction[2],
-                    'priority': correction[3],
-                    'confidence': correction[4],
-                    'frequency': correction[5],
-                    'created_at': correction[6]
-                })
+        write_csv(dict_path, DICTIONARY_FIELDNAMES, corrections, compress)
 
         print(f"📚 Dictionary corrections exported to: {dict_path}")
 
@@ -198,14 +208,14 @@ def export_phrases_with_corrections():
         conn.close()
 
 
-def main():
+def main(compress=False):
     """Main execution function"""
     print("🚀 Thai Phrases Export with Corrections")
     print("=" * 50)
 
     try:
         # Export comprehensive data
-        export_path, review_path, dict_path = export_phrases_with_corrections()
+        export_path, review_path, dict_path = export_phrases_with_corrections(compress)
 
         # Print summary
         print(f"\n📊 EXPORT SUMMARY:")
@@ -230,4 +240,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Pass --gzip to write .csv.gz files instead of plain CSV
+    main(compress='--gzip' in sys.argv[1:])
\ No newline at end of file
@@ -3,43 +3,40 @@
 Simple fix for missing document IDs in Thai phrases
 """
 
-import sqlite3
 import sys
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.config import config
+from scripts._db import cell_keyed_phrase, get_conn
 
 def fix_document_ids():
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     try:
         print('🔧 Fixing missing document IDs...')
 
-        # Get phrase-document mappings
-        cursor.execute('''
-            SELECT tp.id as phrase_id, d.id as doc_id
-            FROM thai_phrases tp
-            JOIN table_cells tc ON tp.source_id = tc.id
+        # Fill every missing document ID in one set-based UPDATE ... FROM
+        # instead of fetching the mappings and updating phrase by phrase.
+        # Only phrases keyed by a table_cells.id qualify; populate_thai_phrases
+        # ones store an extracted_tables.id (see fix_phrase_document_ids.py)
+        cursor.execute(f'''
+            UPDATE thai_phrases
+            SET document_id = d.id
+            FROM table_cells tc
             JOIN extracted_tables et ON tc.extracted_table_id = et.id
             JOIN documents d ON et.document_id = d.id
-            WHERE tp.source_table = 'table_cells'
-            AND tp.document_id IS NULL
-            LIMIT 1000
+            WHERE thai_phrases.source_id = tc.id
+            AND thai_phrases.source_table = 'table_cells'
+            AND thai_phrases.document_id IS NULL
+            AND {cell_keyed_phrase('thai_phrases', 'tc')}
         ''')
 
-        mappings = cursor.fetchall()
-        print(f'Found {len(mappings)} phrase-document mappings')
-
-        # Update each phrase
-        for phrase_id, doc_id in mappings:
-            cursor.execute('UPDATE thai_phrases SET document_id = ? WHERE id = ?', (doc_id, phrase_id))
-
+        updated = cursor.rowcount
         conn.commit()
-        print(f'Updated {len(mappings)} phrase records')
+        print(f'Updated {updated} phrase records')
 
         # Verify results
         cursor.execute('''
@@ -54,9 +51,10 @@ def fix_document_ids():
 
     except Exception as e:
         print(f'Error: {e}')
+        conn.rollback()
         return False
     finally:
-        conn.close()
+        cursor.close()
 
 if __name__ == "__main__":
     fix_document_ids()
\ No newline at end of file
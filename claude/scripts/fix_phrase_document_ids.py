@@ -6,20 +6,19 @@ This script fixes the missing document_id values in thai_phrases table
 by properly joining through the extracted_tables relationship.
 """
 
-import sqlite3
 import sys
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.config import config
+from scripts._db import cell_keyed_phrase, get_conn
 
 
 def fix_missing_document_ids():
     """Fix missing document_id values in thai_phrases table"""
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     try:
@@ -40,24 +39,35 @@ def fix_missing_document_ids():
         print(f"   Missing document_id: {before_stats[1]:,}")
         print(f"   Has document_id: {before_stats[2]:,}")
 
-        # Update phrases from table_cells where document_id is missing
-        # Join through extracted_tables -> documents
-        cursor.execute('''
-            UPDATE thai_phrases tp
-            SET document_id = (
-                SELECT d.id
-                FROM extracted_tables et
-                JOIN documents d ON et.document_id = d.id
-                WHERE et.id = tp.source_id
-                AND tp.source_table = 'table_cells'
-                AND tp.document_id IS NULL
-                LIMIT 1
-            )
-            WHERE tp.source_table = 'table_cells'
-            AND tp.document_id IS NULL
+        # Update phrases from table_cells where document_id is missing.
+        # source_id is a table_cells.id for trigger/sweep/extractor phrases...
+        cursor.execute(f'''
+            UPDATE thai_phrases
+            SET document_id = d.id
+            FROM table_cells tc
+            JOIN extracted_tables et ON tc.extracted_table_id = et.id
+            JOIN documents d ON et.document_id = d.id
+            WHERE tc.id = thai_phrases.source_id
+            AND thai_phrases.source_table = 'table_cells'
+            AND thai_phrases.document_id IS NULL
+            AND {cell_keyed_phrase('thai_phrases', 'tc')}
         ''')
 
         updated_rows = cursor.rowcount
+
+        # ...and an extracted_tables.id for populate_thai_phrases ones ("Row ..." context)
+        cursor.execute('''
+            UPDATE thai_phrases
+            SET document_id = d.id
+            FROM extracted_tables et
+            JOIN documents d ON et.document_id = d.id
+            WHERE et.id = thai_phrases.source_id
+            AND thai_phrases.source_table = 'table_cells'
+            AND thai_phrases.document_id IS NULL
+            AND thai_phrases.context LIKE 'Row %'
+        ''')
+
+        updated_rows += cursor.rowcount
         conn.commit()
 
         print(f"Updated {updated_rows:,} phrase records with missing document_id")
@@ -99,22 +109,24 @@ def fix_missing_document_ids():
         conn.rollback()
         return False
     finally:
-        conn.close()
+        cursor.close()
 
 
 def update_phrase_context():
     """Update phrase context with better information"""
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     try:
         print()
         print("📝 Updating phrase context information...")
 
-        # Update context for table_cells source to include document info
-        cursor.execute('''
-            UPDATE thai_phrases tp
+        # Update context for table_cells source to include document info;
+        # populate_thai_phrases rows key source_id by table, so only rewrite
+        # the phrases whose context shows they came from this very cell
+        cursor.execute(f'''
+            UPDATE thai_phrases
             SET context = (
                 'Table ' || et.id || ', Row ' || tc.row_index || ', Col ' || tc.col_index ||
                 ': ' || SUBSTR(tc.value, 1, 50) || ' | Doc: ' || COALESCE(d.file_name, 'Unknown')
@@ -122,8 +134,9 @@ def update_phrase_context():
             FROM table_cells tc
             JOIN extracted_tables et ON tc.extracted_table_id = et.id
             LEFT JOIN documents d ON et.document_id = d.id
-            WHERE tp.source_id = tc.id
-            AND tp.source_table = 'table_cells'
+            WHERE thai_phrases.source_id = tc.id
+            AND thai_phrases.source_table = 'table_cells'
+            AND {cell_keyed_phrase('thai_phrases', 'tc')}
         ''')
 
         context_updated = cursor.rowcount
@@ -138,13 +151,13 @@ def update_phrase_context():
         conn.rollback()
         return False
     finally:
-        conn.close()
+        cursor.close()
 
 
 def verify_phrase_fixes():
     """Verify that the phrase fixes are working correctly"""
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     try:
@@ -189,7 +202,7 @@ def verify_phrase_fixes():
         print(f"❌ Error verifying fixes: {e}")
         return False
     finally:
-        conn.close()
+        cursor.close()
 
 
 def main():
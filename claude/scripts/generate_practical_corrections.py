@@ -5,109 +5,133 @@ Practical Thai Phrase Corrections
 Creates corrections based on actual observed OCR issues from the Thai phrases
 """
 
-import sqlite3
 import sys
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.config import config
+from scripts._db import get_conn
+
+
+# Common OCR error patterns we observed, as (error_pattern, correction, type)
+PRACTICAL_CORRECTIONS = (
+    # Character/spacing issues
+    ("สินทรัพย์หมุนเวียนอืน", "สินทรัพย์หมุนเวียนอื่น", "character_fix"),
+    ("สินค าคงเหลือ", "สินค้าคงเหลือ", "spacing"),
+    ("สุทธิ", "สุทธิ", "character_fix"),
+    ("จัดสรร สํารองตามกฎหมาย", "จัดสรร - สํารองตามกฎหมาย", "spacing"),
+    ("ผู้ตรวจสอบบัญชี จันทร์เพ็ญ เตชะกําธร 31/05/2568", "ผู้ตรวจสอบบัญชี: จันทร์เพ็ญ เตชะกําธร 31/05/2568", "spacing"),
+    ("การปรับปรุงด วยค่าใช จ่ายภาษี เงินได", "การปรับปรุงด้วยค่าใช้จ่ายภาษีเงินได้", "spacing"),
+    ("คํานวณงบกระแสเงินสด โดยวิธีทางอ ้อม", "คํานวณงบกระแสเงินสด โดยวิธีทางอ้อม", "character_fix"),
+    ("กําไรจากกิจกรรมดําเนินงาน ก่อนการเปลียนแปลงใน สินท", "กําไรจากกิจกรรมดําเนินงานก่อนการเปลี่ยนแปลงในสินทรัพย์", "character_fix"),
+
+    # Missing spaces in long phrases
+    ("เงินสดและรายการเทียบเท่าเงินสด", "เงินสดและรายการเทียบเท่าเงินสด", "spacing"),
+    ("เงินสดและรายการเทียบเท่าเงินสดเพิมขึน", "เงินสดและรายการเทียบเท่าเงินสดเพิ่มขึน", "spacing"),
+    ("เงินสดและรายการเทียบเท่าเงินสดต ้นงวด", "เงินสดและรายการเทียบเท่าเงินสดต้นงวด", "spacing"),
+    ("เงินสดและรายการเทียบเท่าเงินสดปลายงวด", "เงินสดและรายการเทียบเท่าเงินสดปลายงวด", "spacing"),
+
+    # Word boundary issues
+    ("รวมส่วนของผู้ถือหุ้น", "รวมส่วนของผู้ถือหุ้น", "spacing"),
+    ("รวมหนิสินและส่วนของผู้ถือหุ้น", "รวมหนีสินและส่วนของผู้ถือหุ้น", "character_fix"),
+    ("รวมรายการอืน - สินทรัพย์หมุนเวียน", "รวมรายการอื่น - สินทรัพย์หมุนเวียน", "character_fix"),
+    ("รวมส่วนของบริษัทใหญ่", "รวมส่วนของบริษัทใหญ่", "spacing"),
+
+    # Date formatting
+    ("31/05/2568", "31/05/2568", "date_format"),
+
+    # Number formatting
+    ("จํานวนหุ ้น - จดทะเบียน", "จำนวนหุ้น - จดทะเบียน", "character_fix"),
+    ("จํานวนหุ ้น - ทีออกและเรียกชําระแล ว", "จำนวนหุ้น - ที่ออกและเรียกชำระแล้ว", "character_fix"),
+    ("มูลค่าทีตราไว", "มูลค่าที่ตราไว", "character_fix"),
+
+    # Common character OCR errors
+    ("ค้ างรับ", "ค่างรับ", "character_fix"),
+    ("ค่าใช จ่ายค างจ่าย", "ค่าใช้จ่ายค่างจ่าย", "character_fix"),
+    ("ข้อมูลเพิมเติมในส่วนของผู้", "ข้อมูลเพิ่มเติมในส่วนของผู้", "character_fix"),
+    ("ถือหุ้น", "ถือหุ้น", "character_fix"),
+
+    # Cleaning up trailing/leading issues
+    ("สินทรัพย์...", "สินทรัพย์", "cleanup"),
+    ("สุทธิ...", "สุทธิ", "cleanup"),
+    ("กําไร...", "กำไร", "cleanup"),
+    ("ขาดทุน...", "ขาดทุน", "cleanup"),
+)
 
 
 def generate_common_corrections():
     """Generate corrections for common OCR errors observed"""
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     print("🔧 Generating practical Thai phrase corrections...")
 
-    # Common OCR error patterns we observed
-    corrections = [
-        # Character/spacing issues
-        ("สินทรัพย์หมุนเวียนอืน", "สินทรัพย์หมุนเวียนอื่น", "character_fix"),
-        ("สินค าคงเหลือ", "สินค้าคงเหลือ", "spacing"),
-        ("สุทธิ", "สุทธิ", "character_fix"),
-        ("จัดสรร สํารองตามกฎหมาย", "จัดสรร - สํารองตามกฎหมาย", "spacing"),
-        ("ผู้ตรวจสอบบัญชี จันทร์เพ็ญ เตชะกําธร 31/05/2568", "ผู้ตรวจสอบบัญชี: จันทร์เพ็ญ เตชะกําธร 31/05/2568", "spacing"),
-        ("การปรับปรุงด วยค่าใช จ่ายภาษี เงินได", "การปรับปรุงด้วยค่าใช้จ่ายภาษีเงินได้", "spacing"),
-        ("คํานวณงบกระแสเงินสด โดยวิธีทางอ ้อม", "คํานวณงบกระแสเงินสด โดยวิธีทางอ้อม", "character_fix"),
-        ("กําไรจากกิจกรรมดําเนินงาน ก่อนการเปลียนแปลงใน สินท", "กําไรจากกิจกรรมดําเนินงานก่อนการเปลี่ยนแปลงในสินทรัพย์", "character_fix"),
-
-        # Missing spaces in long phrases
-        ("เงินสดและรายการเทียบเท่าเงินสด", "เงินสดและรายการเทียบเท่าเงินสด", "spacing"),
-        ("เงินสดและรายการเทียบเท่าเงินสดเพิมขึน", "เงินสดและรายการเทียบเท่าเงินสดเพิ่มขึน", "spacing"),
-        ("เงินสดและรายการเทียบเท่าเงินสดต ้นงวด", "เงินสดและรายการเทียบเท่าเงินสดต้นงวด", "spacing"),
-        ("เงินสดและรายการเทียบเท่าเงินสดปลายงวด", "เงินสดและรายการเทียบเท่าเงินสดปลายงวด", "spacing"),
-
-        # Word boundary issues
-        ("รวมส่วนของผู้ถือหุ้น", "รวมส่วนของผู้ถือหุ้น", "spacing"),
-        ("รวมหนิสินและส่วนของผู้ถือหุ้น", "รวมหนีสินและส่วนของผู้ถือหุ้น", "character_fix"),
-        ("รวมรายการอืน - สินทรัพย์หมุนเวียน", "รวมรายการอื่น - สินทรัพย์หมุนเวียน", "character_fix"),
-        ("รวมส่วนของบริษัทใหญ่", "รวมส่วนของบริษัทใหญ่", "spacing"),
-
-        # Date formatting
-        ("31/05/2568", "31/05/2568", "date_format"),
-
-        # Number formatting
-        ("จํานวนหุ ้น - จดทะเบียน", "จำนวนหุ้น - จดทะเบียน", "character_fix"),
-        ("จํานวนหุ ้น - ทีออกและเรียกชําระแล ว", "จำนวนหุ้น - ที่ออกและเรียกชำระแล้ว", "character_fix"),
-        ("มูลค่าทีตราไว", "มูลค่าที่ตราไว", "character_fix"),
-
-        # Common character OCR errors
-        ("ค้ างรับ", "ค่างรับ", "character_fix"),
-        ("ค่าใช จ่ายค างจ่าย", "ค่าใช้จ่ายค่างจ่าย", "character_fix"),
-        ("ข้อมูลเพิมเติมในส่วนของผู้", "ข้อมูลเพิ่มเติมในส่วนของผู้", "character_fix"),
-        ("ถือหุ้น", "ถือหุ้น", "character_fix"),
-
-        # Cleaning up trailing/leading issues
-        ("สินทรัพย์...", "สินทรัพย์", "cleanup"),
-        ("สุทธิ...", "สุทธิ", "cleanup"),
-        ("กําไร...", "กำไร", "cleanup"),
-        ("ขาดทุน...", "ขาดทุน", "cleanup"),
-    ]
+    # Stage the list in a temp table so the existence check, insert and phrase
+    # update each run as one set-based statement instead of once per correction
+    cursor.execute('DROP TABLE IF EXISTS temp.practical_corrections')
+    cursor.execute('''
+        CREATE TEMP TABLE practical_corrections (
+            original TEXT NOT NULL,
+            correction TEXT NOT NULL,
+            type TEXT NOT NULL
+        )
+    ''')
+    cursor.executemany('INSERT INTO practical_corrections VALUES (?, ?, ?)', PRACTICAL_CORRECTIONS)
+
+    # Keep only corrections that are not already active in the dictionary
+    cursor.execute('''
+        DELETE FROM practical_corrections
+        WHERE EXISTS (
+            SELECT 1 FROM thai_ocr_corrections o
+            WHERE o.error_pattern = practical_corrections.original
+            AND o.correction = practical_corrections.correction
+            AND o.is_active = 1
+        )
+    ''')
+
+    # Add new corrections
+    cursor.execute('''
+        INSERT INTO thai_ocr_corrections
+        (error_pattern, correction, type, confidence, frequency, description,
+         example, priority, is_active, created_at, updated_at)
+        SELECT original, correction, type, 0.9, 1,
+               'Practical correction for ' || type,
+               original || ' → ' || correction,
+               'high', TRUE, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM practical_corrections
+        ORDER BY rowid
+    ''')
 
-    corrections_added = 0
-
-    for original, correction, correction_type in corrections:
-        # Check if correction already exists
-        cursor.execute('''
-            SELECT id FROM thai_ocr_corrections
-            WHERE error_pattern = ? AND correction = ? AND is_active = 1
-        ''', (original, correction))
-
-        if not cursor.fetchone():
-            # Add new correction
-            cursor.execute('''
-                INSERT INTO thai_ocr_corrections
-                (error_pattern, correction, type, confidence, frequency, description,
-                 example, priority, is_active, created_at, updated_at)
-                VALUES (?, ?, ?, 0.9, 1, ?, ?, 'high', TRUE, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            ''', (
-                original,
-                correction,
-                correction_type,
-                f"Practical correction for {correction_type}",
-                f"{original} → {correction}"
-            ))
-
-            corrections_added += 1
-            print(f"   ✅ Added: {original[:40]}... → {correction[:40]}...")
-
-            # Update phrases that have this exact error
-            cursor.execute('''
-                UPDATE thai_phrases
-                SET correction_suggestion = ?,
-                    needs_correction = TRUE,
-                    status = 'reviewed',
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE phrase = ? AND correction_suggestion IS NULL
-            ''', (correction, original))
-
-            updated_phrases = cursor.rowcount
-            if updated_phrases > 0:
-                print(f"      → Updated {updated_phrases} phrase(s)")
+    corrections_added = cursor.rowcount
+
+    # Report each new correction with the number of phrases it is about to update
+    cursor.execute('''
+        SELECT pc.original, pc.correction, COUNT(tp.id)
+        FROM practical_corrections pc
+        LEFT JOIN thai_phrases tp
+            ON tp.phrase = pc.original AND tp.correction_suggestion IS NULL
+        GROUP BY pc.rowid
+        ORDER BY pc.rowid
+    ''')
+    for original, correction, matching_phrases in cursor.fetchall():
+        print(f"   ✅ Added: {original[:40]}... → {correction[:40]}...")
+        if matching_phrases > 0:
+            print(f"      → Updated {matching_phrases} phrase(s)")
+
+    # Update phrases that have one of the new errors (UPDATE ... FROM is
+    # within scripts._db.MIN_SQLITE_VERSION, checked when get_conn() connects)
+    cursor.execute('''
+        UPDATE thai_phrases
+        SET correction_suggestion = pc.correction,
+            needs_correction = TRUE,
+            status = 'reviewed',
+            updated_at = CURRENT_TIMESTAMP
+        FROM practical_corrections pc
+        WHERE thai_phrases.phrase = pc.original
+        AND thai_phrases.correction_suggestion IS NULL
+    ''')
 
     conn.commit()
 
@@ -119,7 +143,7 @@ def generate_common_corrections():
 def mark_phrases_for_review():
     """Mark additional phrases that need manual review"""
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     print("\n📋 Marking additional phrases for review...")
@@ -136,20 +160,39 @@ def mark_phrases_for_review():
         "word_count > 15",
     ]
 
-    total_marked = 0
-    for criterion in review_criteria:
-        cursor.execute(f'''
-            UPDATE thai_phrases
-            SET needs_correction = TRUE,
-                status = 'reviewed',
-                updated_at = CURRENT_TIMESTAMP
-            WHERE {criterion}
-            AND needs_correction = FALSE
-        ''')
-
-        marked_count = cursor.rowcount
-        total_marked += marked_count
-        print(f"   ✓ Marked {marked_count} phrases for: {criterion}")
+    # Attribute each unmarked phrase to the first criterion it meets, in one scan
+    first_match = ' '.join(
+        f"WHEN {criterion} THEN {index}" for index, criterion in enumerate(review_criteria)
+    )
+    cursor.execute(f'''
+        SELECT matched, COUNT(*)
+        FROM (
+            SELECT CASE {first_match} END AS matched
+            FROM thai_phrases
+            WHERE needs_correction = FALSE
+        )
+        WHERE matched IS NOT NULL
+        GROUP BY matched
+    ''')
+    criterion_counts = dict(cursor.fetchall())
+
+    # Mark every phrase meeting any criterion with a single UPDATE. This is one
+    # sequential scan by design: SQLite's planner will not turn the OR into index
+    # range scans even with LENGTH(phrase)/confidence_score/word_count indexes,
+    # so such indexes would only slow down phrase inserts.
+    any_criterion = ' OR '.join(f"({criterion})" for criterion in review_criteria)
+    cursor.execute(f'''
+        UPDATE thai_phrases
+        SET needs_correction = TRUE,
+            status = 'reviewed',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE ({any_criterion})
+        AND needs_correction = FALSE
+    ''')
+
+    total_marked = cursor.rowcount
+    for index, criterion in enumerate(review_criteria):
+        print(f"   ✓ Marked {criterion_counts.get(index, 0)} phrases for: {criterion}")
 
     conn.commit()
     print(f"\n📊 Total phrases marked for review: {total_marked}")
@@ -160,7 +203,7 @@ def mark_phrases_for_review():
 def update_statistics():
     """Update phrase statistics"""
 
-    conn = sqlite3.connect(config.DATABASE_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
     print("\n📊 Updating phrase statistics...")
@@ -186,7 +229,7 @@ def update_statistics():
     print(f"   Corrected: {corrected:,}")
     print(f"   Reviewed: {reviewed:,}")
 
-    conn.close()
+    cursor.close()
     return stats
 
 
@@ -219,6 +262,8 @@ def main():
 
     except Exception as e:
         print(f"❌ Error: {e}")
+        # The steps share one connection; don't leave a failed step's writes pending
+        get_conn().rollback()
         import traceback
         traceback.print_exc()
 
@@ -4,8 +4,11 @@ Integrate Phrase Extraction into OCR Workflow
 
 This script integrates Thai phrase extraction into the existing OCR processing
 pipeline so that phrases are automatically extracted and stored during processing.
+
+Run with --sweep to only extract phrases from table cells added since the last sweep.
 """
 
+import json
 import sqlite3
 import sys
 from pathlib import Path
@@ -14,145 +17,317 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import config
+from scripts._db import tune_connection
 from utils.thai_phrase_extractor import ThaiPhraseExtractor
 
 
-def update_processing_workflow():
+def _replace_view(name, sql):
+    """Statements that drop and recreate a view (SQLite has no CREATE OR REPLACE VIEW)"""
+    return f"DROP VIEW IF EXISTS {name}", f"CREATE VIEW {name} AS {sql}"
+
+
+def _run_ddl(conn, statements):
+    """Run DDL statements as a single script inside one transaction
+
+    executescript() compiles and steps the whole batch in one call. Should a
+    statement fail, the transaction is left open for the caller to roll back.
+    """
+    conn.executescript('BEGIN;\n' + ';\n'.join(statements) + ';\nCOMMIT;')
+
+
+def _drop_correction_count_triggers():
+    """Statements that drop the triggers maintaining phrase_correction_counts"""
+    return tuple(
+        f"DROP TRIGGER IF EXISTS phrase_correction_counts_{event}"
+        for event in ('insert', 'update', 'delete')
+    )
+
+
+def update_processing_workflow(conn):
     """Update the OCR processing workflow to include phrase extraction"""
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         print("🔄 Updating OCR processing workflow...")
 
-        # Add a trigger to automatically extract phrases when new table cells are added
-        cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS extract_thai_phrases_from_new_cells
-            AFTER INSERT ON table_cells
-            WHEN NEW.value IS NOT NULL
-            BEGIN
-                INSERT OR IGNORE INTO thai_phrases
+        # Apply the whole setup atomically
+        with conn:
+            cursor.execute('BEGIN')
+
+            # Recreate the triggers so existing databases pick up the current bodies
+            cursor.execute('DROP TRIGGER IF EXISTS extract_thai_phrases_from_new_cells')
+            cursor.execute('DROP TRIGGER IF EXISTS extract_thai_phrases_from_document_cache')
+
+            if not config.PHRASE_EXTRACTION_TRIGGERS_ENABLED:
+                print("ℹ️  Phrase extraction triggers disabled; new cells are picked up by the backlog sweep")
+                return True
+
+            # Add a trigger to automatically extract phrases when new table cells are added.
+            # The Thai/length filter lives in the WHEN clause so non-Thai cells skip the
+            # trigger body entirely; it stays plain SQL (no Python function) because the
+            # trigger also fires on the app's connections. The trimmed value is computed
+            # once in a FROM-less subquery rather than repeated per output column, and
+            # the document id is read straight off the extracted_tables row (rowid seek).
+            cursor.execute('''
+                CREATE TRIGGER extract_thai_phrases_from_new_cells
+                AFTER INSERT ON table_cells
+                WHEN NEW.value IS NOT NULL
+                AND LENGTH(TRIM(NEW.value)) > 2
+                AND NEW.value GLOB '*[ก-ฮ]*'
+                BEGIN
+                    INSERT OR IGNORE INTO thai_phrases
+                    (phrase, source_table, source_id, document_id, confidence_score, context, word_count, status, created_at, updated_at)
+                    SELECT
+                        v.phrase,
+                        'table_cells',
+                        NEW.id,
+                        (SELECT et.document_id FROM extracted_tables et WHERE et.id = NEW.extracted_table_id),
+                        NEW.confidence_score,
+                        'Table ' || NEW.extracted_table_id || ', Row ' || NEW.row_index || ', Col ' || NEW.col_index || ': ' || SUBSTR(NEW.value, 1, 50),
+                        LENGTH(v.phrase) - LENGTH(REPLACE(v.phrase, ' ', '')) + 1,
+                        'pending',
+                        CURRENT_TIMESTAMP,
+                        CURRENT_TIMESTAMP
+                    FROM (SELECT TRIM(NEW.value) AS phrase) v;
+                END
+            ''')
+
+            # Add similar trigger for processed document cache; the MATERIALIZED CTE
+            # keeps the optimizer from flattening the per-block expressions back in,
+            # and the document_id index lets it take the newest 10 entries by a
+            # reverse index scan instead of whichever rows a full scan meets first
+            cursor.execute("""
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name = 'processed_document_cache'
+            """)
+            if cursor.fetchone():
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS ix_pdc_document_id ON processed_document_cache(document_id)
+                ''')
+
+            cursor.execute('''
+                CREATE TRIGGER extract_thai_phrases_from_document_cache
+                AFTER UPDATE OF processed ON documents
+                WHEN NEW.processed = 1 AND OLD.processed = 0
+                BEGIN
+                    INSERT OR IGNORE INTO thai_phrases
+                    (phrase, source_table, source_id, document_id, confidence_score, context, word_count, status, created_at, updated_at)
+                    WITH blocks AS MATERIALIZED (
+                        SELECT
+                            dc.id,
+                            TRIM(SUBSTR(dc.text_blocks, 1, 100)) AS phrase,
+                            SUBSTR(dc.text_blocks, 1, 50) AS preview
+                        FROM processed_document_cache dc
+                        WHERE dc.document_id = NEW.id
+                        AND LENGTH(TRIM(dc.text_blocks)) > 2
+                        AND dc.text_blocks GLOB '*[ก-ฮ]*'
+                        ORDER BY dc.id DESC
+                        LIMIT 10  -- Limit to prevent excessive data
+                    )
+                    SELECT
+                        b.phrase,
+                        'processed_document_cache',
+                        b.id,
+                        NEW.id,
+                        0.8,
+                        'Document text block: ' || b.preview,
+                        LENGTH(b.phrase) - LENGTH(REPLACE(b.phrase, ' ', '')) + 1,
+                        'pending',
+                        CURRENT_TIMESTAMP,
+                        CURRENT_TIMESTAMP
+                    FROM blocks b;
+                END
+            ''')
+
+        print("✅ Triggers created successfully")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Error creating triggers: {e}")
+        return False
+
+
+def sweep_phrase_backlog(conn):
+    """Extract Thai phrases from table cells added since the last sweep
+
+    Batch equivalent of the table_cells trigger: one INSERT ... SELECT over the
+    cells past the stored watermark. For bulk ingest with the triggers enabled,
+    drop them, load the cells, run this sweep, then recreate them.
+
+    The first sweep only records the current MAX(id): cells already in the
+    table were covered by populate_thai_phrases or the triggers. While the
+    cell trigger exists it has extracted every new cell, so the watermark is
+    just advanced. A MAX(id) below the watermark means table_cells was wiped,
+    so the sweep restarts from 0.
+    """
+
+    try:
+        cursor = conn.cursor()
+
+        print("🧹 Sweeping table cells for new Thai phrases...")
+
+        # Hold the write lock for the whole sweep; rolled back on failure
+        with conn:
+            cursor.execute('BEGIN IMMEDIATE')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS phrase_extraction_state (
+                    source_table TEXT PRIMARY KEY,
+                    last_seen_id INTEGER NOT NULL
+                )
+            ''')
+
+            cursor.execute('''
+                SELECT last_seen_id FROM phrase_extraction_state WHERE source_table = 'table_cells'
+            ''')
+            row = cursor.fetchone()
+
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM table_cells')
+            latest = cursor.fetchone()[0]
+
+            cursor.execute('''
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'trigger' AND name = 'extract_thai_phrases_from_new_cells'
+            ''')
+            trigger_active = cursor.fetchone() is not None
+
+            if row is None or trigger_active:
+                # Existing cells are already covered; only new ones get swept
+                last_seen = latest
+            elif latest < row[0]:
+                # table_cells.id is a plain rowid, so ids restart after a wipe
+                print(f"⚠️  table_cells ids restarted (max {latest} < watermark {row[0]}); sweeping from the start")
+                last_seen = 0
+            else:
+                last_seen = row[0]
+
+            # table_cells.id is the rowid, so the range scan needs no extra index
+            cursor.execute('''
+                INSERT INTO thai_phrases
                 (phrase, source_table, source_id, document_id, confidence_score, context, word_count, status, created_at, updated_at)
                 SELECT
-                    TRIM(NEW.value),
+                    v.phrase,
                     'table_cells',
-                    NEW.id,
-                    (SELECT d.id FROM extracted_tables et JOIN documents d ON et.document_id = d.id WHERE et.id = NEW.extracted_table_id),
-                    NEW.confidence_score,
-                    'Table ' || NEW.extracted_table_id || ', Row ' || NEW.row_index || ', Col ' || NEW.col_index || ': ' || SUBSTR(NEW.value, 1, 50),
-                    LENGTH(TRIM(NEW.value)) - LENGTH(REPLACE(TRIM(NEW.value), ' ', '')) + 1,
+                    v.id,
+                    et.document_id,
+                    v.confidence_score,
+                    'Table ' || v.extracted_table_id || ', Row ' || v.row_index || ', Col ' || v.col_index || ': ' || SUBSTR(v.value, 1, 50),
+                    LENGTH(v.phrase) - LENGTH(REPLACE(v.phrase, ' ', '')) + 1,
                     'pending',
                     CURRENT_TIMESTAMP,
                     CURRENT_TIMESTAMP
-                WHERE NEW.value GLOB '*[ก-ฮ]*'
-                AND LENGTH(TRIM(NEW.value)) > 2;
-            END
-        ''')
-
-        # Add similar trigger for processed document cache
-        cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS extract_thai_phrases_from_document_cache
-            AFTER UPDATE OF processed ON documents
-            WHEN NEW.processed = 1 AND OLD.processed = 0
-            BEGIN
-                INSERT OR IGNORE INTO thai_phrases
-                (phrase, source_table, source_id, document_id, confidence_score, context, word_count, status, created_at, updated_at)
-                SELECT
-                    TRIM(SUBSTR(dc.text_blocks, 1, 100)),
-                    'processed_document_cache',
-                    dc.id,
-                    NEW.id,
-                    0.8,
-                    'Document text block: ' || SUBSTR(dc.text_blocks, 1, 50),
-                    LENGTH(TRIM(SUBSTR(dc.text_blocks, 1, 100))) - LENGTH(REPLACE(TRIM(SUBSTR(dc.text_blocks, 1, 100)), ' ', '')) + 1,
-                    'pending',
-                    CURRENT_TIMESTAMP,
-                    CURRENT_TIMESTAMP
-                FROM processed_document_cache dc
-                WHERE dc.document_id = NEW.id
-                AND dc.text_blocks GLOB '*[ก-ฮ]*'
-                AND LENGTH(TRIM(dc.text_blocks)) > 2
-                LIMIT 10;  -- Limit to prevent excessive data
-            END
-        ''')
-
-        conn.commit()
-        print("✅ Triggers created successfully")
+                FROM (
+                    SELECT tc.id, tc.extracted_table_id, tc.row_index, tc.col_index, tc.value,
+                           tc.confidence_score, TRIM(tc.value) AS phrase
+                    FROM table_cells tc
+                    WHERE tc.id > ? AND tc.id <= ?
+                    AND tc.value IS NOT NULL
+                    AND LENGTH(TRIM(tc.value)) > 2
+                    AND tc.value GLOB '*[ก-ฮ]*'
+                ) v
+                LEFT JOIN extracted_tables et ON et.id = v.extracted_table_id
+                ORDER BY v.id
+            ''', (last_seen, latest))
+            phrases_added = cursor.rowcount
+
+            cursor.execute('''
+                INSERT INTO phrase_extraction_state (source_table, last_seen_id)
+                VALUES ('table_cells', ?)
+                ON CONFLICT(source_table) DO UPDATE SET last_seen_id = excluded.last_seen_id
+            ''', (latest,))
+
+        if last_seen < latest:
+            print(f"✅ Added {phrases_added} Thai phrases from cells {last_seen + 1}-{latest}")
+        else:
+            print(f"✅ No new table cells to sweep (watermark at {latest})")
 
         return True
 
     except Exception as e:
-        print(f"❌ Error creating triggers: {e}")
+        print(f"❌ Error sweeping phrase backlog: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 
-def create_phrase_processing_function():
+def create_phrase_processing_function(conn):
     """Create a database function to process phrases manually"""
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
-        cursor = conn.cursor()
 
         print("🔧 Creating phrase processing utilities...")
 
-        # Create a function to identify Thai text (simplified)
-        # Note: SQLite doesn't support custom functions easily, so we'll use views
+        # Run the DDL as one script inside a single transaction
+        with conn:
+            _run_ddl(conn, [
+                # Create a function to identify Thai text (simplified)
+                # Note: SQLite doesn't support custom functions easily, so we'll use views
+
+                # Make sure the indexes the views run on exist even on databases created
+                # before create_thai_phrase_table.py added them: the pending partial index
+                # is the row source and already yields confidence_score order, and the
+                # document index backs the documents join
+                '''
+                    CREATE INDEX IF NOT EXISTS idx_tp_pending_high_conf ON thai_phrases(status, confidence_score, word_count)
+                    WHERE status = 'pending'
+                ''',
+
+                '''
+                    CREATE INDEX IF NOT EXISTS idx_thai_phrases_document ON thai_phrases(document_id)
+                ''',
+
+                # Create a view for phrases that need review; the status/flag predicates
+                # lead so the remaining checks only run on pending rows
+                *_replace_view('phrases_needing_review', '''
+                    SELECT
+                        tp.id,
+                        tp.phrase,
+                        tp.word_count,
+                        tp.confidence_score,
+                        tp.source_table,
+                        tp.context,
+                        d.file_name as document_file,
+                        c.name_th as company_name,
+                        tp.created_at
+                    FROM thai_phrases tp
+                    LEFT JOIN documents d ON tp.document_id = d.id
+                    LEFT JOIN fiscal_years fy ON d.fiscal_year_id = fy.id
+                    LEFT JOIN companies c ON fy.company_id = c.id
+                    WHERE tp.status = 'pending'
+                    AND tp.needs_correction = FALSE
+                    AND (
+                        tp.word_count > 10
+                        OR LENGTH(tp.phrase) < 3
+                        OR tp.confidence_score < 0.7
+                    )
+                    ORDER BY tp.confidence_score ASC
+                '''),
+
+                # Create a view for high-quality phrases (no review needed)
+                *_replace_view('phrases_high_quality', '''
+                    SELECT
+                        tp.id,
+                        tp.phrase,
+                        tp.word_count,
+                        tp.confidence_score,
+                        tp.source_table,
+                        tp.context,
+                        d.file_name as document_file,
+                        c.name_th as company_name,
+                        tp.created_at
+                    FROM thai_phrases tp
+                    LEFT JOIN documents d ON tp.document_id = d.id
+                    LEFT JOIN fiscal_years fy ON d.fiscal_year_id = fy.id
+                    LEFT JOIN companies c ON fy.company_id = c.id
+                    WHERE tp.status = 'pending'
+                    AND tp.needs_correction = FALSE
+                    AND tp.word_count <= 8
+                    AND tp.confidence_score >= 0.8
+                    AND LENGTH(tp.phrase) >= 3
+                    ORDER BY tp.confidence_score DESC
+                '''),
+            ])
 
-        # Create a view for phrases that need review
-        cursor.execute('''
-            CREATE OR REPLACE VIEW phrases_needing_review AS
-            SELECT
-                tp.id,
-                tp.phrase,
-                tp.word_count,
-                tp.confidence_score,
-                tp.source_table,
-                tp.context,
-                d.file_name as document_file,
-                c.name_th as company_name,
-                tp.created_at
-            FROM thai_phrases tp
-            LEFT JOIN documents d ON tp.document_id = d.id
-            LEFT JOIN companies c ON d.company_id = c.id
-            WHERE tp.needs_correction = FALSE
-            AND tp.status = 'pending'
-            AND (
-                tp.confidence_score < 0.7
-                OR tp.word_count > 10
-                OR LENGTH(tp.phrase) < 3
-            )
-            ORDER BY tp.confidence_score ASC
-        ''')
-
-        # Create a view for high-quality phrases (no review needed)
-        cursor.execute('''
-            CREATE OR REPLACE VIEW phrases_high_quality AS
-            SELECT
-                tp.id,
-                tp.phrase,
-                tp.word_count,
-                tp.confidence_score,
-                tp.source_table,
-                tp.context,
-                d.file_name as document_file,
-                c.name_th as company_name,
-                tp.created_at
-            FROM thai_phrases tp
-            LEFT JOIN documents d ON tp.document_id = d.id
-            LEFT JOIN companies c ON d.company_id = c.id
-            WHERE tp.needs_correction = FALSE
-            AND tp.status = 'pending'
-            AND tp.confidence_score >= 0.8
-            AND tp.word_count <= 8
-            AND LENGTH(tp.phrase) >= 3
-            ORDER BY tp.confidence_score DESC
-        ''')
-
-        conn.commit()
         print("✅ Phrase processing views created successfully")
 
         return True
@@ -160,63 +335,36 @@ def create_phrase_processing_function():
     except Exception as e:
         print(f"❌ Error creating processing views: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 
-def create_phrase_batch_processor():
-    """Create a stored procedure for batch phrase processing"""
+def create_phrase_batch_processor(conn):
+    """Create the job table used for batch phrase processing"""
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
-        cursor = conn.cursor()
 
         print("⚡ Creating batch phrase processing utilities...")
 
-        # Create a table for batch processing jobs
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS phrase_processing_jobs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                job_type TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                total_phrases INTEGER DEFAULT 0,
-                processed_phrases INTEGER DEFAULT 0,
-                started_at TIMESTAMP,
-                completed_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                notes TEXT
-            )
-        ''')
-
-        # Create a function to mark phrases as reviewed
-        cursor.execute('''
-            CREATE OR REPLACE FUNCTION mark_phrases_reviewed(
-                phrase_ids TEXT,
-                reviewer_name TEXT,
-                review_notes TEXT
-            )
-            RETURNS INTEGER
-            AS $$
-            BEGIN
-                UPDATE thai_phrases
-                SET
-                    is_reviewed = TRUE,
-                    status = 'reviewed',
-                    reviewed_by = reviewer_name,
-                    notes = review_notes,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id IN (SELECT CAST(TRIM(value) AS INTEGER)
-                           FROM json_each('[' || phrase_ids || ']'))
-                RETURNING_changes();
-            END;
-            $$ LANGUAGE plpgsql;
-        ''')
-
-        # SQLite doesn't support PL/pgSQL, so we'll skip this for now
-        print("⚠️  Advanced batch processing functions skipped (requires PostgreSQL)")
-
-        conn.commit()
+        # Run the DDL as one script inside a single transaction
+        with conn:
+            _run_ddl(conn, [
+                # Create a table for batch processing jobs
+                '''
+                    CREATE TABLE IF NOT EXISTS phrase_processing_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        job_type TEXT NOT NULL,
+                        status TEXT DEFAULT 'pending',
+                        total_phrases INTEGER DEFAULT 0,
+                        processed_phrases INTEGER DEFAULT 0,
+                        started_at TIMESTAMP,
+                        completed_at TIMESTAMP,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        notes TEXT
+                    )
+                ''',
+            ])
+
+        # SQLite has no stored procedures; reviews are marked from Python with
+        # mark_phrases_reviewed() instead
         print("✅ Basic batch processing structure created")
 
         return True
@@ -224,48 +372,160 @@ def create_phrase_batch_processor():
     except Exception as e:
         print(f"❌ Error creating batch processor: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 
-def create_phrase_export_utilities():
+def mark_phrases_reviewed(conn, phrase_ids, reviewer_name, review_notes=None):
+    """Mark the given phrases as reviewed and return how many were updated
+
+    The ids are bound as a single JSON array and expanded with json_each, so any
+    number of ids is one statement with one bound parameter.
+    """
+
+    phrase_ids = [int(phrase_id) for phrase_id in phrase_ids]
+    if not phrase_ids:
+        return 0
+
+    with conn:
+        cursor = conn.execute('''
+            UPDATE thai_phrases
+            SET
+                is_reviewed = TRUE,
+                status = 'reviewed',
+                reviewed_by = ?,
+                notes = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (reviewer_name, review_notes, json.dumps(phrase_ids)))
+        return cursor.rowcount
+
+
+def create_phrase_export_utilities(conn):
     """Create utilities for exporting phrases and corrections"""
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
-        cursor = conn.cursor()
 
         print("📤 Creating phrase export utilities...")
 
-        # Create view for export-ready corrections
-        cursor.execute('''
-            CREATE OR REPLACE VIEW export_ready_corrections AS
-            SELECT
-                tp.phrase as error_pattern,
-                tp.correction_suggestion as correction,
-                CASE
-                    WHEN tp.correction_suggestion IS NOT NULL AND tp.correction_suggestion != '' THEN 'manual_review'
-                    ELSE 'automatic_detection'
-                END as source_type,
-                COUNT(*) as frequency,
-                0.9 as confidence,
-                CASE
-                    WHEN tp.needs_correction = TRUE THEN 'high'
-                    ELSE 'medium'
-                END as priority,
-                'character_correction' as type,
-                'Manual correction from phrase review' as description,
-                tp.phrase || ' → ' || COALESCE(tp.correction_suggestion, tp.phrase) as example
-            FROM thai_phrases tp
-            WHERE tp.needs_correction = TRUE
-            AND tp.correction_suggestion IS NOT NULL
-            AND tp.correction_suggestion != ''
-            GROUP BY tp.phrase, tp.correction_suggestion
-            ORDER BY COUNT(*) DESC
-        ''')
-
-        conn.commit()
+        if config.PHRASE_CORRECTION_COUNTS_ENABLED:
+            ddl = [
+                # Summary table of correction frequencies, rebuilt from thai_phrases
+                # here and kept current by the triggers below
+                '''
+                    CREATE TABLE IF NOT EXISTS phrase_correction_counts (
+                        phrase TEXT NOT NULL,
+                        correction TEXT NOT NULL,
+                        n INTEGER NOT NULL,
+                        PRIMARY KEY (phrase, correction)
+                    )
+                ''',
+
+                'DELETE FROM phrase_correction_counts',
+
+                '''
+                    INSERT INTO phrase_correction_counts (phrase, correction, n)
+                    SELECT phrase, correction_suggestion, COUNT(*)
+                    FROM thai_phrases
+                    WHERE needs_correction = TRUE
+                    AND correction_suggestion != ''
+                    GROUP BY phrase, correction_suggestion
+                ''',
+
+                *_drop_correction_count_triggers(),
+
+                '''
+                    CREATE TRIGGER phrase_correction_counts_insert
+                    AFTER INSERT ON thai_phrases
+                    WHEN NEW.needs_correction = TRUE AND NEW.correction_suggestion != ''
+                    BEGIN
+                        INSERT INTO phrase_correction_counts (phrase, correction, n)
+                        VALUES (NEW.phrase, NEW.correction_suggestion, 1)
+                        ON CONFLICT (phrase, correction) DO UPDATE SET n = n + 1;
+                    END
+                ''',
+
+                '''
+                    CREATE TRIGGER phrase_correction_counts_delete
+                    AFTER DELETE ON thai_phrases
+                    WHEN OLD.needs_correction = TRUE AND OLD.correction_suggestion != ''
+                    BEGIN
+                        UPDATE phrase_correction_counts SET n = n - 1
+                        WHERE phrase = OLD.phrase AND correction = OLD.correction_suggestion;
+                        DELETE FROM phrase_correction_counts
+                        WHERE phrase = OLD.phrase AND correction = OLD.correction_suggestion AND n <= 0;
+                    END
+                ''',
+
+                # Corrections are mostly flagged by UPDATE, so move the row's count
+                # from its old (phrase, correction) pair to the new one
+                '''
+                    CREATE TRIGGER phrase_correction_counts_update
+                    AFTER UPDATE OF phrase, needs_correction, correction_suggestion ON thai_phrases
+                    BEGIN
+                        UPDATE phrase_correction_counts SET n = n - 1
+                        WHERE OLD.needs_correction = TRUE AND OLD.correction_suggestion != ''
+                        AND phrase = OLD.phrase AND correction = OLD.correction_suggestion;
+                        DELETE FROM phrase_correction_counts
+                        WHERE phrase = OLD.phrase AND correction = OLD.correction_suggestion AND n <= 0;
+                        INSERT INTO phrase_correction_counts (phrase, correction, n)
+                        SELECT NEW.phrase, NEW.correction_suggestion, 1
+                        WHERE NEW.needs_correction = TRUE AND NEW.correction_suggestion != ''
+                        ON CONFLICT (phrase, correction) DO UPDATE SET n = n + 1;
+                    END
+                ''',
+
+                # Create view for export-ready corrections from the counts table;
+                # every counted row is a flagged phrase with a suggestion
+                *_replace_view('export_ready_corrections', '''
+                    SELECT
+                        pcc.phrase as error_pattern,
+                        pcc.correction as correction,
+                        'manual_review' as source_type,
+                        pcc.n as frequency,
+                        0.9 as confidence,
+                        'high' as priority,
+                        'character_correction' as type,
+                        'Manual correction from phrase review' as description,
+                        pcc.phrase || ' → ' || pcc.correction as example
+                    FROM phrase_correction_counts pcc
+                    ORDER BY pcc.n DESC
+                '''),
+            ]
+        else:
+            ddl = [
+                *_drop_correction_count_triggers(),
+                'DROP TABLE IF EXISTS phrase_correction_counts',
+
+                # Create view for export-ready corrections
+                *_replace_view('export_ready_corrections', '''
+                    SELECT
+                        tp.phrase as error_pattern,
+                        tp.correction_suggestion as correction,
+                        CASE
+                            WHEN tp.correction_suggestion IS NOT NULL AND tp.correction_suggestion != '' THEN 'manual_review'
+                            ELSE 'automatic_detection'
+                        END as source_type,
+                        COUNT(*) as frequency,
+                        0.9 as confidence,
+                        CASE
+                            WHEN tp.needs_correction = TRUE THEN 'high'
+                            ELSE 'medium'
+                        END as priority,
+                        'character_correction' as type,
+                        'Manual correction from phrase review' as description,
+                        tp.phrase || ' → ' || COALESCE(tp.correction_suggestion, tp.phrase) as example
+                    FROM thai_phrases tp
+                    WHERE tp.needs_correction = TRUE
+                    AND tp.correction_suggestion IS NOT NULL
+                    AND tp.correction_suggestion != ''
+                    GROUP BY tp.phrase, tp.correction_suggestion
+                    ORDER BY COUNT(*) DESC
+                '''),
+            ]
+
+        # Run the DDL as one script inside a single transaction
+        with conn:
+            _run_ddl(conn, ddl)
+
         print("✅ Export utilities created successfully")
 
         return True
@@ -273,9 +533,6 @@ def create_phrase_export_utilities():
     except Exception as e:
         print(f"❌ Error creating export utilities: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 
 def update_main_app_integration():
@@ -284,6 +541,11 @@ def update_main_app_integration():
     integration_code = '''
 # Thai Phrase Integration for Main App
 
+import sqlite3
+
+from app.config import config
+
+
 def extract_phrases_after_processing(document_id: int) -> dict:
     """Extract phrases after document processing is complete"""
     try:
@@ -299,14 +561,15 @@ def get_phrase_count_for_dashboard():
         conn = sqlite3.connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) FROM thai_phrases')
-        total = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM thai_phrases WHERE needs_correction = TRUE')
-        needs_review = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM thai_phrases WHERE status = "pending"')
-        pending = cursor.fetchone()[0]
+        # All three counts in a single pass over thai_phrases
+        cursor.execute("""
+            SELECT
+                COUNT(*),
+                COUNT(CASE WHEN needs_correction = TRUE THEN 1 END),
+                COUNT(CASE WHEN status = 'pending' THEN 1 END)
+            FROM thai_phrases
+        """)
+        total, needs_review, pending = cursor.fetchone()
 
         conn.close()
 
@@ -333,29 +596,42 @@ def main():
     print("🔗 Integrating Thai Phrase Extraction into OCR Workflow")
     print("=" * 60)
 
-    # Update processing workflow
-    if update_processing_workflow():
-        print("✅ Processing workflow updated")
-    else:
-        print("❌ Failed to update workflow")
-
-    # Create phrase processing utilities
-    if create_phrase_processing_function():
-        print("✅ Phrase processing utilities created")
-    else:
-        print("❌ Failed to create processing utilities")
-
-    # Create batch processor
-    if create_phrase_batch_processor():
-        print("✅ Batch processor created")
-    else:
-        print("❌ Failed to create batch processor")
-
-    # Create export utilities
-    if create_phrase_export_utilities():
-        print("✅ Export utilities created")
-    else:
-        print("❌ Failed to create export utilities")
+    # Run every database step on one tuned connection; each step still
+    # commits its own transaction so a failed step doesn't undo the others
+    conn = tune_connection(sqlite3.connect(config.DATABASE_PATH))
+    try:
+        # Update processing workflow
+        if update_processing_workflow(conn):
+            print("✅ Processing workflow updated")
+        else:
+            print("❌ Failed to update workflow")
+
+        # Without the triggers, catch up on cells added since the last sweep
+        if not config.PHRASE_EXTRACTION_TRIGGERS_ENABLED:
+            if sweep_phrase_backlog(conn):
+                print("✅ Phrase backlog swept")
+            else:
+                print("❌ Failed to sweep phrase backlog")
+
+        # Create phrase processing utilities
+        if create_phrase_processing_function(conn):
+            print("✅ Phrase processing utilities created")
+        else:
+            print("❌ Failed to create processing utilities")
+
+        # Create batch processor
+        if create_phrase_batch_processor(conn):
+            print("✅ Batch processor created")
+        else:
+            print("❌ Failed to create batch processor")
+
+        # Create export utilities
+        if create_phrase_export_utilities(conn):
+            print("✅ Export utilities created")
+        else:
+            print("❌ Failed to create export utilities")
+    finally:
+        conn.close()
 
     # Create main app integration
     if update_main_app_integration():
@@ -365,7 +641,10 @@ def main():
 
     print("\n🎉 Thai Phrase Extraction Integration Complete!")
     print("\nFeatures added:")
-    print("✅ Automatic phrase extraction triggers")
+    if config.PHRASE_EXTRACTION_TRIGGERS_ENABLED:
+        print("✅ Automatic phrase extraction triggers")
+    else:
+        print("✅ Batch phrase extraction sweep")
     print("✅ Phrase review and management views")
     print("✅ Export utilities for dictionary updates")
     print("✅ Main app integration helpers")
@@ -375,5 +654,16 @@ def main():
     print("3. Review and process extracted phrases")
 
 
+def sweep_main():
+    """Run only the phrase backlog sweep, e.g. from a periodic job"""
+    conn = tune_connection(sqlite3.connect(config.DATABASE_PATH))
+    try:
+        return sweep_phrase_backlog(conn)
+    finally:
+        conn.close()
+
+
 if __name__ == "__main__":
+    if '--sweep' in sys.argv[1:]:
+        sys.exit(0 if sweep_main() else 1)
     main()
\ No newline at end of file
@@ -6,6 +6,8 @@ This migration:
 1. Adds 'engine' column to documents table with default 'docling'
 2. Creates unique constraint on (file_path, engine)
 3. Clears existing extracted tables data (will be re-processed)
+
+Pass --strict to also rebuild documents as a STRICT table afterwards.
 """
 
 import sqlite3
@@ -16,9 +18,178 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import config
+from scripts._db import tune_connection
+
+
+# Tables whose extracted data is not engine-specific and must be re-processed
+WIPED_TABLES = ('table_cells', 'extracted_tables', 'processed_document_cache')
+
+
+def wipe_tables(cursor, tables):
+    """Empty tables by dropping and recreating them with their indexes and triggers.
+
+    Dropping frees the pages in one step instead of deleting row by row. With
+    PRAGMA foreign_keys enabled a DROP would be checked like a DELETE against
+    referencing rows, so fall back to DELETE with the secondary indexes
+    dropped and rebuilt around it.
+
+    sqlite3 does not open a transaction for DDL, so the caller must hold one
+    (BEGIN IMMEDIATE) for the drop and recreate to be atomic.
+    """
+    placeholders = ', '.join('?' * len(tables))
+    cursor.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL
+        ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END
+    """, tables)
+    schema = cursor.fetchall()
+
+    cursor.execute("PRAGMA foreign_keys")
+    if cursor.fetchone()[0]:
+        indexes = [(name, sql) for obj_type, name, sql in schema if obj_type == 'index']
+        for index_name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{index_name}"')
+        for table in tables:
+            cursor.execute(f'DELETE FROM "{table}"')
+        for _, index_sql in indexes:
+            cursor.execute(index_sql)
+        return
+
+    for table in tables:
+        cursor.execute(f'DROP TABLE "{table}"')
+    for _, _, sql in schema:
+        cursor.execute(sql)
+
+
+def strict_type(declared_type):
+    """Map a declared column type onto the nearest type a STRICT table accepts"""
+    declared_type = declared_type.upper()
+    if 'INT' in declared_type or 'BOOL' in declared_type:
+        return 'INTEGER'
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'REAL'
+    if 'BLOB' in declared_type:
+        return 'BLOB'
+    return 'TEXT'
+
+
+def rebuild_documents_strict(conn):
+    """Rebuild documents as a STRICT table with the (file_path, engine) constraint.
+
+    Copying into a fresh table packs the rows densely and rebuilds every
+    b-tree, and lets the unique constraint the ORM schema declares be added to
+    databases that predate it. Follows SQLite's create-copy-drop-rename
+    procedure; legacy_alter_table keeps the rename from re-validating views
+    that name documents while it is briefly missing.
+
+    Runs after the migration has committed, so it never raises: a failure
+    rolls back the rebuild only, is reported, and returns False.
+    """
+    if sqlite3.sqlite_version_info < (3, 37, 0):
+        print(f"\nSTRICT tables need SQLite 3.37+, found {sqlite3.sqlite_version}; skipping rebuild")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA table_list(documents)")
+        if cursor.fetchone()[5]:
+            print("\ndocuments is already a STRICT table")
+            return True
+
+        cursor.execute("PRAGMA foreign_keys")
+        foreign_keys = cursor.fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"\nSTRICT rebuild skipped, could not inspect documents: {e}")
+        return False
 
+    print("\nRebuilding documents as a STRICT table...")
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    cursor.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        cursor.execute("PRAGMA table_info(documents)")
+        columns = cursor.fetchall()
 
-def migrate():
+        cursor.execute("PRAGMA foreign_key_list(documents)")
+        references = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT sql FROM sqlite_master
+            WHERE tbl_name = 'documents' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+            ORDER BY CASE type WHEN 'index' THEN 0 ELSE 1 END
+        """)
+        dependents = [row[0] for row in cursor.fetchall()]
+
+        definitions = []
+        for _, name, declared_type, not_null, default, pk in columns:
+            if pk:
+                definitions.append(f'"{name}" INTEGER PRIMARY KEY')
+                continue
+            definition = f'"{name}" {strict_type(declared_type)}'
+            if not_null:
+                definition += ' NOT NULL'
+            if default is not None:
+                definition += f' DEFAULT {default}'
+            definitions.append(definition)
+        for _, _, table, from_col, to_col, *_ in references:
+            definitions.append(f'FOREIGN KEY ("{from_col}") REFERENCES "{table}" ("{to_col}")')
+        definitions.append('CONSTRAINT uq_document_filepath_engine UNIQUE (file_path, engine)')
+
+        column_list = ', '.join(f'"{col[1]}"' for col in columns)
+        cursor.execute("CREATE TABLE documents_strict (\n    " + ",\n    ".join(definitions) + "\n) STRICT")
+        cursor.execute(f"INSERT INTO documents_strict ({column_list}) SELECT {column_list} FROM documents")
+        cursor.execute("DROP TABLE documents")
+        cursor.execute("ALTER TABLE documents_strict RENAME TO documents")
+        for sql in dependents:
+            cursor.execute(sql)
+
+        cursor.execute("PRAGMA foreign_key_check")
+        if cursor.fetchone():
+            raise sqlite3.IntegrityError("foreign key violations after rebuilding documents")
+
+        conn.commit()
+        print(f"  Rebuilt documents ({len(columns)} columns) as STRICT")
+        return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"  STRICT rebuild failed, documents left unchanged: {e}")
+        return False
+    finally:
+        try:
+            cursor.execute("PRAGMA legacy_alter_table = OFF")
+            cursor.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+        except sqlite3.Error as e:
+            print(f"  Warning: could not restore connection PRAGMAs after the STRICT rebuild: {e}")
+
+
+def compact_and_analyze(conn):
+    """VACUUM the freed pages and refresh planner statistics after the migration commits.
+
+    Both are maintenance on an already committed migration, so a failure (e.g.
+    too little temporary space for VACUUM) is reported as a warning only.
+    """
+    cursor = conn.cursor()
+    try:
+        # The wiped tables' pages sit on the freelist; hand them back to the filesystem
+        cursor.execute("PRAGMA freelist_count")
+        free_pages = cursor.fetchone()[0]
+        if free_pages:
+            print(f"\nVacuuming {free_pages} free pages (needs temporary space about the size of the database)...")
+            cursor.execute("VACUUM")
+            print("  Database compacted")
+    except sqlite3.Error as e:
+        print(f"  Warning: VACUUM failed, the migration is still committed: {e}")
+
+    try:
+        # Refresh the planner statistics for the rewritten tables
+        cursor.execute("ANALYZE")
+    except sqlite3.Error as e:
+        print(f"  Warning: ANALYZE failed, the migration is still committed: {e}")
+
+
+def migrate(strict=False):
     """Run the migration."""
     db_path = config.DATABASE_PATH
 
@@ -27,10 +198,14 @@ def migrate():
         print("Run init_database.py first to create the database.")
         return False
 
-    conn = sqlite3.connect(db_path)
+    conn = tune_connection(sqlite3.connect(db_path))
     cursor = conn.cursor()
 
     try:
+        # sqlite3 autocommits DDL, so open the transaction explicitly: the
+        # column add, wipe, status reset and index stay atomic until commit
+        cursor.execute("BEGIN IMMEDIATE")
+
         # Check if engine column already exists
         cursor.execute("PRAGMA table_info(documents)")
         columns = [col[1] for col in cursor.fetchall()]
@@ -41,20 +216,10 @@ def migrate():
             print("Adding 'engine' column to documents table...")
             cursor.execute("""
                 ALTER TABLE documents
-                ADD COLUMN engine VARCHAR(20) NOT NULL DEFAULT 'docling'
+                ADD COLUMN engine TEXT NOT NULL DEFAULT 'docling'
             """)
             print("  Added 'engine' column with default 'docling'")
 
-        # Create index on engine column if it doesn't exist
-        cursor.execute("""
-            SELECT name FROM sqlite_master
-            WHERE type='index' AND name='ix_documents_engine'
-        """)
-        if not cursor.fetchone():
-            print("Creating index on engine column...")
-            cursor.execute("CREATE INDEX ix_documents_engine ON documents(engine)")
-            print("  Created index ix_documents_engine")
-
         # Note: SQLite doesn't support adding constraints to existing tables
         # The unique constraint will be enforced by the application layer
         # For new databases, the constraint is defined in the schema
@@ -68,18 +233,29 @@ def migrate():
         cursor.execute("SELECT COUNT(*) FROM extracted_tables")
         table_count = cursor.fetchone()[0]
 
-        cursor.execute("DELETE FROM table_cells")
-        cursor.execute("DELETE FROM extracted_tables")
-
-        print(f"  Deleted {cell_count} cells and {table_count} tables")
-
-        # Also clear processed_document_cache to force re-processing
         cursor.execute("SELECT COUNT(*) FROM processed_document_cache")
         cache_count = cursor.fetchone()[0]
 
-        cursor.execute("DELETE FROM processed_document_cache")
+        wipe_tables(cursor, WIPED_TABLES)
+
+        print(f"  Deleted {cell_count} cells and {table_count} tables")
+
+        # processed_document_cache is wiped with them to force re-processing
         print(f"  Deleted {cache_count} cache entries")
 
+        # Cell ids restart after the wipe; rewind the phrase sweep watermark
+        # (not delete it, which would make the next sweep skip the re-processed cells)
+        cursor.execute("""
+            SELECT 1 FROM sqlite_master
+            WHERE type='table' AND name='phrase_extraction_state'
+        """)
+        if cursor.fetchone():
+            cursor.execute("""
+                UPDATE phrase_extraction_state SET last_seen_id = 0
+                WHERE source_table = 'table_cells'
+            """)
+            print("  Reset the table_cells phrase sweep watermark")
+
         # Reset documents to pending status
         # Use UPPERCASE to match SQLAlchemy Enum member names
         cursor.execute("""
@@ -88,18 +264,39 @@ def migrate():
         """)
         print("  Reset all documents to 'pending' status")
 
+        # Create index on engine column if it doesn't exist, after the bulk
+        # status update so the b-tree is built once from the final rows
+        cursor.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='index' AND name='ix_documents_engine'
+        """)
+        if not cursor.fetchone():
+            print("Creating index on engine column...")
+            cursor.execute("CREATE INDEX ix_documents_engine ON documents(engine)")
+            print("  Created index ix_documents_engine")
+
         conn.commit()
-        print("\nMigration completed successfully!")
-        print("Please re-process documents to populate engine-specific data.")
-        return True
 
     except Exception as e:
         conn.rollback()
+        conn.close()
         print(f"Migration failed: {e}")
         return False
+
+    # The migration is committed from here on; follow-up steps only warn
+    try:
+        # Optional follow-up: compact documents into a STRICT table
+        if strict:
+            rebuild_documents_strict(conn)
+
+        compact_and_analyze(conn)
     finally:
         conn.close()
 
+    print("\nMigration completed successfully!")
+    print("Please re-process documents to populate engine-specific data.")
+    return True
+
 
 if __name__ == "__main__":
-    migrate()
+    migrate(strict='--strict' in sys.argv[1:])
@@ -16,6 +16,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import config
+from scripts._db import tune_connection
 
 
 def migrate():
@@ -27,10 +28,13 @@ def migrate():
         print("Run init_database.py first to create the database.")
         return False
 
-    conn = sqlite3.connect(db_path)
+    conn = tune_connection(sqlite3.connect(db_path))
     cursor = conn.cursor()
 
     try:
+        # Run the whole migration as one explicit write transaction
+        cursor.execute("BEGIN IMMEDIATE")
+
         # Check current schema
         cursor.execute("PRAGMA table_info(documents)")
         columns = {col[1] for col in cursor.fetchall()}
@@ -69,34 +73,28 @@ def migrate():
             if cache_count > 0:
                 print("Migrating data from cache to documents table...")
 
-                # Get all cache entries
+                # Join cache rows onto documents inside SQLite with UPDATE ... FROM;
+                # documents is scanned once and each row looks up its cache entry
+                # through ix_pdc_file_path
                 cursor.execute("""
-                    SELECT file_path, engine, markdown_content, text_content,
-                           tables_found, text_blocks, file_hash
-                    FROM processed_document_cache
-                    WHERE status = 'success'
+                    UPDATE documents
+                    SET markdown_content = dc.markdown_content,
+                        text_content = dc.text_content,
+                        tables_found = dc.tables_found,
+                        text_blocks = dc.text_blocks,
+                        file_hash = COALESCE(documents.file_hash, dc.file_hash)
+                    FROM processed_document_cache dc
+                    WHERE documents.file_path = dc.file_path
+                    AND documents.engine = dc.engine
+                    AND dc.status = 'success'
                 """)
-                cache_entries = cursor.fetchall()
-
-                migrated = 0
-                for entry in cache_entries:
-                    file_path, engine, markdown, text, tables, blocks, file_hash = entry
 
-                    # Update corresponding document record
-                    cursor.execute("""
-                        UPDATE documents
-                        SET markdown_content = ?,
-                            text_content = ?,
-                            tables_found = ?,
-                            text_blocks = ?,
-                            file_hash = COALESCE(file_hash, ?)
-                        WHERE file_path = ? AND engine = ?
-                    """, (markdown, text, tables, blocks, file_hash, file_path, engine))
+                # rowcount is the number of documents updated; documents has no
+                # unique (file_path, engine) index on upgraded databases, so this
+                # is not necessarily one per cache entry
+                migrated = cursor.rowcount
 
-                    if cursor.rowcount > 0:
-                        migrated += 1
-
-                print(f"  Migrated {migrated} entries to documents table")
+                print(f"  Updated {migrated} documents from the cache")
 
             # Step 4: Drop the cache table
             print("\nDropping processed_document_cache table...")
@@ -106,6 +104,13 @@ def migrate():
             print("\nprocessed_document_cache table does not exist (already migrated)")
 
         conn.commit()
+
+        # Refresh the planner statistics for the rewritten tables; the migration
+        # is already committed, so a failure here is only a warning
+        try:
+            cursor.execute("ANALYZE")
+        except sqlite3.Error as e:
+            print(f"  Warning: ANALYZE failed, the migration is still committed: {e}")
         print("\nMigration completed successfully!")
         print("\nNew architecture:")
         print("  - documents table now stores markdown_content, text_content")
@@ -8,13 +8,76 @@ Analyzes Thai phrases from OCR results and identifies common issues
 import sqlite3
 import re
 import sys
+import functools
+import multiprocessing
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import config
+from scripts._db import tune_connection
+
+# Rows per keyset page read from thai_phrases, and phrases per task sent to
+# a worker process
+PAGE_SIZE = 10000
+WORKER_CHUNK_SIZE = 500
+
+# Thai Unicode block, and the same check as a GLOB for SQLite to apply
+THAI_PATTERN = re.compile(r'[\u0E00-\u0E7F]')
+THAI_GLOB = '*[\u0E00-\u0E7F]*'
+
+# OCR artifact patterns, compiled once for the per-phrase checks
+ZERO_WIDTH_PATTERN = re.compile(r'[\u200B-\u200D\ufeff]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+EXCESSIVE_WHITESPACE_PATTERN = re.compile(r'\s{3,}')
+REPEATED_CHAR_PATTERN = re.compile(r'(.)\1{3,}')
+# Any of the three artifacts above, so clean phrases are cleared with one search
+ARTIFACT_PATTERN = re.compile(r'[\u200B-\u200D\ufeff]|\s{3,}|(.)\1{3,}')
+
+
+# Financial terms commonly found in financial statements
+FINANCIAL_TERMS = (
+    'สินทรัพย์', 'สินทรัพย์หมุนเวียน', 'สินทรัพย์ไม่หมุนเวียน',
+    'เงินสด', 'ลูกหนี', 'เจ้าหนี', 'หนีสิน', 'งบดุล', 'งบแสดง',
+    'กำไร', 'ขาดทุน', 'สะสม', 'บริษัท', 'ผู้ถือหุ้น', 'ทุน',
+    'ภาษีเงินได้', 'ค่าใช้จ่าย', 'รายได้', 'รายจ่าย',
+    'ที่ดิน', 'อาคาร', 'อุปกรณ์', 'เงินลงทุนระยะยาว',
+    'เงินให้กู้ยืม', 'ดอกเบี้ยจ่าย', 'งบบริษัท', 'ผู้ตรวจสอบบัญชี',
+    'รวม', 'สุทธิ', 'ทุนจดทะเบียน', 'หุ้นสามัญ',
+    'ค่าใช้จ่ายค่าง่าย', 'เงินเบิกเกินบัญชี', 'ส่วนของผู้ถือหุ้น',
+    'การปรับปรุง', 'ทุนที่ออก', 'มูลค่า', 'จัดสรร'
+)
+
+# Any-term test as one compiled alternation, longest terms first
+FINANCIAL_TERMS_PATTERN = re.compile('|'.join(
+    re.escape(term) for term in sorted(FINANCIAL_TERMS, key=len, reverse=True)
+))
+
+# Match all financial terms in a single pass when pyahocorasick is installed
+TERM_AUTOMATON = None
+if AHOCORASICK_AVAILABLE:
+    TERM_AUTOMATON = ahocorasick.Automaton()
+    for _term in FINANCIAL_TERMS:
+        TERM_AUTOMATON.add_word(_term, _term)
+    TERM_AUTOMATON.make_automaton()
+
+
+class PhraseAnalysis(NamedTuple):
+    """Result of analyze_phrase; immutable so cached results can be shared"""
+    has_issues: bool
+    issues: Tuple[str, ...]
+    suggestion: Optional[str]
+    found_terms: Tuple[str, ...]
+    length: int
 
 
 def is_thai_text(text):
@@ -22,7 +85,7 @@ def is_thai_text(text):
     if not text:
         return False
     # Check for Thai character range
-    return any(ord(char) >= 3584 and ord(char) <= 3711 for char in text)
+    return THAI_PATTERN.search(text) is not None
 
 
 def clean_thai_text(text):
@@ -31,196 +94,248 @@ def clean_thai_text(text):
         return ""
 
     # Remove common OCR artifacts
-    text = re.sub(r'[\u200B-\u200D\ufeff]', '', text)  # Zero-width chars
-    text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
+    text = ZERO_WIDTH_PATTERN.sub('', text)  # Zero-width chars
+    text = WHITESPACE_PATTERN.sub(' ', text)  # Normalize whitespace
     text = text.strip()  # Trim
 
     return text
 
 
-class ThaiPhraseAnalyzer:
-    """Simple Thai phrase analyzer"""
+def find_financial_terms(text):
+    """Return the distinct financial terms contained in text"""
 
-    def __init__(self):
-        self.conn = sqlite3.connect(config.DATABASE_PATH)
-        self.cursor = self.conn.cursor()
+    if TERM_AUTOMATON is not None:
+        return tuple(dict.fromkeys(term for _, term in TERM_AUTOMATON.iter(text)))
 
-        # Financial terms commonly found in financial statements
-        self.financial_terms = [
-            'สินทรัพย์', 'สินทรัพย์หมุนเวียน', 'สินทรัพย์ไม่หมุนเวียน',
-            'เงินสด', 'ลูกหนี', 'เจ้าหนี', 'หนีสิน', 'งบดุล', 'งบแสดง',
-            'กำไร', 'ขาดทุน', 'สะสม', 'บริษัท', 'ผู้ถือหุ้น', 'ทุน',
-            'ภาษีเงินได้', 'ค่าใช้จ่าย', 'รายได้', 'รายจ่าย',
-            'ที่ดิน', 'อาคาร', 'อุปกรณ์', 'เงินลงทุนระยะยาว',
-            'เงินให้กู้ยืม', 'ดอกเบี้ยจ่าย', 'งบบริษัท', 'ผู้ตรวจสอบบัญชี',
-            'รวม', 'สุทธิ', 'ทุนจดทะเบียน', 'หุ้นสามัญ',
-            'ค่าใช้จ่ายค่าง่าย', 'เงินเบิกเกินบัญชี', 'ส่วนของผู้ถือหุ้น',
-            'การปรับปรุง', 'ทุนที่ออก', 'มูลค่า', 'จัดสรร'
-        ]
+    # Most phrases contain no term at all, so reject them with one regex scan.
+    # findall alone would miss terms nested inside longer ones (e.g. สินทรัพย์
+    # inside สินทรัพย์หมุนเวียน), so hits still get the full containment check
+    if not FINANCIAL_TERMS_PATTERN.search(text):
+        return ()
+    return tuple(term for term in FINANCIAL_TERMS if term in text)
 
-    def analyze_phrases(self):
-        """Analyze all Thai phrases and identify issues"""
 
-        print("🔍 Analyzing Thai phrases...")
+# OCR output repeats the same labels across documents, so memoize the analysis
+@functools.lru_cache(maxsize=65536)
+def analyze_phrase(phrase):
+    """Analyze a single phrase for issues"""
 
-        # Get all phrases
-        self.cursor.execute('''
-            SELECT id, phrase, confidence_score, word_count, status, needs_correction
-            FROM thai_phrases
-            ORDER BY id
-            LIMIT 1000  -- Process first 1000 for testing
-        ''')
+    issues = []
+    has_issues = False
+    suggestion = phrase
 
-        phrases = self.cursor.fetchall()
+    # Check for basic issues
+    original = phrase
 
-        quality_issues = []
-        phrase_analysis = []
+    # Most phrases carry none of the artifacts in checks 1, 2 and 4, so one
+    # combined search decides whether those checks need to run at all
+    has_artifacts = ARTIFACT_PATTERN.search(phrase) is not None
 
-        for phrase_id, phrase, confidence, word_count, status, needs_correction in phrases:
-            if not phrase or not is_thai_text(phrase.strip()):
-                continue
+    if has_artifacts:
+        # 1. Zero-width characters (the suggestion is still the phrase here, so
+        # one subn both detects and strips them)
+        suggestion, zero_width_count = ZERO_WIDTH_PATTERN.subn('', suggestion)
+        if zero_width_count:
+            issues.append("zero_width_chars")
+            has_issues = True
 
-            # Analyze single phrase
-            analysis = self.analyze_single_phrase(phrase)
+        # 2. Excessive whitespace
+        if EXCESSIVE_WHITESPACE_PATTERN.search(phrase):
+            issues.append("excessive_whitespace")
+            suggestion = WHITESPACE_PATTERN.sub(' ', suggestion)
+            has_issues = True
 
-            if analysis['has_issues']:
-                quality_issues.append({
-                    'id': phrase_id,
-                    'original': phrase,
-                    'confidence': confidence,
-                    'issues': analysis['issues'],
-                    'suggestion': analysis['suggestion']
-                })
+    # 3. Missing spaces in long phrases
+    if len(phrase) > 15 and ' ' not in phrase:
+        issues.append("potential_missing_spaces")
+        has_issues = True
 
-            phrase_analysis.append(analysis)
+    # 4. Check for repeated characters (OCR artifact)
+    if has_artifacts and REPEATED_CHAR_PATTERN.search(phrase):
+        issues.append("repeated_characters")
+        suggestion = REPEATED_CHAR_PATTERN.sub(r'\1', suggestion)
+        has_issues = True
 
-        print(f"📊 Analysis complete:")
-        print(f"   Phrases analyzed: {len(phrases)}")
-        print(f"   Phrases with issues: {len(quality_issues)}")
+    # 5. Clean final suggestion
+    suggestion = clean_thai_text(suggestion)
 
-        return quality_issues, phrase_analysis
+    # 6. Check if it contains known financial terms
+    found_terms = find_financial_terms(suggestion)
 
-    def analyze_single_phrase(self, phrase):
-        """Analyze a single phrase for issues"""
+    # 7. Flag phrases with no recognizable content
+    if len(suggestion) > 10 and not found_terms:
+        issues.append("unrecognized_content")
+        has_issues = True
 
-        issues = []
-        has_issues = False
-        suggestion = phrase
+    return PhraseAnalysis(
+        has_issues=has_issues,
+        issues=tuple(issues),
+        suggestion=suggestion if suggestion != original else None,
+        found_terms=found_terms,
+        length=len(suggestion)
+    )
 
-        # Check for basic issues
-        original = phrase
 
-        # 1. Zero-width characters
-        if re.search(r'[\u200B-\u200D\ufeff]', phrase):
-            issues.append("zero_width_chars")
-            suggestion = re.sub(r'[\u200B-\u200D\ufeff]', '', suggestion)
-            has_issues = True
+class ThaiPhraseAnalyzer:
+    """Simple Thai phrase analyzer"""
 
-        # 2. Excessive whitespace
-        if re.search(r'\s{3,}', phrase):
-            issues.append("excessive_whitespace")
-            suggestion = re.sub(r'\s+', ' ', suggestion)
-            has_issues = True
+    def __init__(self):
+        self.conn = tune_connection(sqlite3.connect(config.DATABASE_PATH))
+        self.cursor = self.conn.cursor()
 
-        # 3. Missing spaces in long phrases
-        if len(phrase) > 15 and ' ' not in phrase:
-            # Try to identify potential word breaks
-            cleaned = suggestion
-            # Look for financial terms and add appropriate spacing
-            for term in self.financial_terms:
-                if term in cleaned:
-                    # Term is present, might need spacing around it
-                    pass
-            issues.append("potential_missing_spaces")
-            has_issues = True
+    def analyze_phrases(self, processes=1):
+        """Analyze all Thai phrases and identify issues
 
-        # 4. Check for repeated characters (OCR artifact)
-        if re.search(r'(.)\1{3,}', phrase):
-            issues.append("repeated_characters")
-            suggestion = re.sub(r'(.)\1{3,}', r'\1', suggestion)
-            has_issues = True
+        Phrase analysis is CPU-bound and independent per phrase, so large runs
+        can fan it out to a process pool (processes=None uses every CPU); the
+        default runs it inline. All database work stays in this process.
+        """
 
-        # 5. Clean final suggestion
-        suggestion = clean_thai_text(suggestion)
+        print("🔍 Analyzing Thai phrases...")
 
-        # 6. Check if it contains known financial terms
-        found_terms = []
-        for term in self.financial_terms:
-            if term in suggestion:
-                found_terms.append(term)
+        # Page through the Thai phrases by primary key so each page is its own
+        # short read instead of one statement held open for the whole analysis;
+        # SQLite drops empty and non-Thai rows before they reach Python
+        page_sql = '''
+            SELECT id, phrase, confidence_score
+            FROM thai_phrases
+            WHERE id > ? AND phrase GLOB ?
+            ORDER BY id
+            LIMIT ?
+        '''
+        last_id = 0
 
-        # 7. Flag phrases with no recognizable content
-        if len(suggestion) > 10 and not found_terms:
-            issues.append("unrecognized_content")
-            has_issues = True
+        quality_issues = []
+        # Aggregate the per-phrase analysis as it streams past
+        issue_counts = Counter()
+        found_terms = set()
+        confidence_total = 0.0
+        confidence_count = 0
+        phrases_analyzed = 0
+
+        # sqlite3 objects are bound to this thread, so rows are fetched here a
+        # page at a time and only the phrase strings are handed to the pool,
+        # whose spawned (not forked) workers never inherit the open connection
+        pool = None
+        if processes != 1:
+            pool = multiprocessing.get_context('spawn').Pool(processes)
 
-        return {
-            'has_issues': has_issues,
-            'issues': issues,
-            'suggestion': suggestion if suggestion != original else None,
-            'found_terms': found_terms,
-            'length': len(suggestion)
-        }
+        try:
+            while True:
+                rows = self.cursor.execute(page_sql, (last_id, THAI_GLOB, PAGE_SIZE)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                phrases_analyzed += len(rows)
+
+                phrases = [phrase for _, phrase, _ in rows]
+                if pool:
+                    # imap keeps results in row order, so the report is unchanged
+                    analyses = pool.imap(analyze_phrase, phrases, chunksize=WORKER_CHUNK_SIZE)
+                else:
+                    analyses = map(analyze_phrase, phrases)
+
+                for (phrase_id, phrase, confidence), analysis in zip(rows, analyses):
+                    if analysis.has_issues:
+                        quality_issues.append({
+                            'id': phrase_id,
+                            'original': phrase,
+                            'confidence': confidence,
+                            'issues': analysis.issues,
+                            'suggestion': analysis.suggestion
+                        })
+                        issue_counts.update(analysis.issues)
+                        if confidence is not None:
+                            confidence_total += confidence
+                            confidence_count += 1
+
+                    found_terms.update(analysis.found_terms)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        print(f"📊 Analysis complete:")
+        print(f"   Phrases analyzed: {phrases_analyzed}")
+        print(f"   Phrases with issues: {len(quality_issues)}")
+
+        avg_confidence = confidence_total / confidence_count if confidence_count else 0
+        return quality_issues, issue_counts, found_terms, avg_confidence
+
+    def analyze_single_phrase(self, phrase):
+        """Analyze a single phrase for issues"""
+        return analyze_phrase(phrase)
 
     def update_database_corrections(self, quality_issues):
         """Update database with correction suggestions"""
 
         print("🔧 Updating database with corrections...")
 
-        updated_count = 0
-
-        for issue in quality_issues:
-            phrase_id = issue['id']
-            suggestion = issue['suggestion']
-
-            if suggestion and suggestion != issue['original']:
-                # Update phrase record
-                self.cursor.execute('''
-                    UPDATE thai_phrases
-                    SET needs_correction = TRUE,
-                        correction_suggestion = ?,
-                        status = 'reviewed',
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (suggestion, phrase_id))
-
-                updated_count += 1
-
-                # Add to corrections dictionary if not exists
-                self.cursor.execute('''
-                    SELECT id FROM thai_ocr_corrections
-                    WHERE error_pattern = ? AND correction = ? AND is_active = 1
-                ''', (issue['original'], suggestion))
-
-                if not self.cursor.fetchone():
-                    self.cursor.execute('''
-                        INSERT INTO thai_ocr_corrections
-                        (error_pattern, correction, type, confidence, frequency, description,
-                         example, priority, is_active, created_at, updated_at)
-                        VALUES (?, ?, 'other', 0.8, 0, ?, ?, 'medium', TRUE, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    ''', (
-                        issue['original'],
-                        suggestion,
-                        f"Auto-correction for: {', '.join(issue['issues'])}",
-                        f"{issue['original']} → {suggestion}"
-                    ))
+        pending_rows = [
+            (
+                issue['id'],
+                issue['original'],
+                issue['suggestion'],
+                f"Auto-correction for: {', '.join(issue['issues'])}"
+            )
+            for issue in quality_issues
+            if issue['suggestion'] and issue['suggestion'] != issue['original']
+        ]
+
+        # Apply all writes in one explicit transaction
+        self.cursor.execute('BEGIN IMMEDIATE')
+
+        # Stage the suggestions in a temp table so the phrase update and the
+        # dictionary insert each run as one set-based statement
+        self.cursor.execute('DROP TABLE IF EXISTS temp.pending_corrections')
+        self.cursor.execute('''
+            CREATE TEMP TABLE pending_corrections (
+                phrase_id INTEGER PRIMARY KEY,
+                original TEXT NOT NULL,
+                suggestion TEXT NOT NULL,
+                description TEXT NOT NULL
+            )
+        ''')
+        self.cursor.executemany('INSERT INTO pending_corrections VALUES (?, ?, ?, ?)', pending_rows)
 
+        # Update phrase records (UPDATE ... FROM is within
+        # scripts._db.MIN_SQLITE_VERSION, checked when tune_connection() connects)
+        self.cursor.execute('''
+            UPDATE thai_phrases
+            SET needs_correction = TRUE,
+                correction_suggestion = pc.suggestion,
+                status = 'reviewed',
+                updated_at = CURRENT_TIMESTAMP
+            FROM pending_corrections pc
+            WHERE thai_phrases.id = pc.phrase_id
+        ''')
+
+        # Add to corrections dictionary if not exists; the table's
+        # UNIQUE(error_pattern, correction) makes the existence check implicit
+        self.cursor.execute('''
+            INSERT OR IGNORE INTO thai_ocr_corrections
+            (error_pattern, correction, type, confidence, frequency, description,
+             example, priority, is_active, created_at, updated_at)
+            SELECT original, suggestion, 'other', 0.8, 0, description,
+                   original || ' → ' || suggestion,
+                   'medium', TRUE, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            FROM pending_corrections
+            ORDER BY phrase_id
+        ''')
+
+        self.cursor.execute('DROP TABLE temp.pending_corrections')
         self.conn.commit()
+        updated_count = len(pending_rows)
         print(f"✅ Updated {updated_count} phrases with correction suggestions")
         return updated_count
 
-    def generate_report(self, quality_issues, phrase_analysis):
+    def generate_report(self, quality_issues, issue_counts, all_found_terms, avg_confidence):
         """Generate analysis report"""
 
         print("\n📊 THAI PHRASE ANALYSIS REPORT")
         print("=" * 40)
 
         # Issue distribution
-        issue_counts = defaultdict(int)
-        for issue in quality_issues:
-            for issue_type in issue['issues']:
-                issue_counts[issue_type] += 1
-
         print("📈 Issue Distribution:")
         for issue_type, count in sorted(issue_counts.items(), key=lambda x: x[1], reverse=True):
             print(f"   {issue_type}: {count}")
@@ -237,17 +352,11 @@ class ThaiPhraseAnalyzer:
             print()
 
         # Financial terms found
-        all_found_terms = set()
-        for analysis in phrase_analysis:
-            all_found_terms.update(analysis.get('found_terms', []))
-
         print(f"📋 Financial Terms Found ({len(all_found_terms)}):")
         for term in sorted(all_found_terms):
             print(f"   ✓ {term}")
 
         # Statistics
-        confidences = [issue['confidence'] for issue in quality_issues if issue['confidence'] is not None]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
         print(f"\n📈 Statistics:")
         print(f"   Phrases needing correction: {len(quality_issues)}")
         print(f"   Average confidence: {avg_confidence:.3f}")
@@ -283,10 +392,10 @@ class ThaiPhraseAnalyzer:
 
         try:
             # Step 1: Analyze phrases
-            quality_issues, phrase_analysis = self.analyze_phrases()
+            quality_issues, issue_counts, found_terms, avg_confidence = self.analyze_phrases()
 
             # Step 2: Generate report
-            self.generate_report(quality_issues, phrase_analysis)
+            self.generate_report(quality_issues, issue_counts, found_terms, avg_confidence)
 
             # Step 3: Update database
             updated_count = self.update_database_corrections(quality_issues)
@@ -5,12 +5,15 @@ Typhoon OCR Test Script for Y67 Documents
 Tests Typhoon OCR API on sample PDF files from Y67 folder.
 Results are saved in markdown format.
 
-Rate limits: 2 req/s, 20 req/min - script includes delays to respect limits.
+Rate limits: 2 req/s, 20 req/min - requests are throttled to stay within them.
 """
 
 import os
 import sys
 import time
+import asyncio
+from collections import deque
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
@@ -34,6 +37,55 @@ print(f"✓ API key loaded (ending in ...{api_key[-4:]})")
 # Import typhoon_ocr after setting env var
 from typhoon_ocr import ocr_document
 
+# Typhoon OCR API limits as (max requests, window in seconds)
+RATE_LIMITS = ((2, 1.0), (20, 60.0))
+
+
+class RateLimiter:
+    """
+    Async sliding-window limiter enforcing several (max_calls, period) limits at once.
+    Use as `async with limiter:` around each API request.
+    """
+
+    def __init__(self, limits=RATE_LIMITS):
+        self.limits = limits
+        self._calls = deque(maxlen=max(max_calls for max_calls, _ in limits))
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                # Wait until every window has room for one more call
+                wait = 0.0
+                for max_calls, period in self.limits:
+                    if len(self._calls) >= max_calls:
+                        oldest = self._calls[-max_calls]
+                        wait = max(wait, oldest + period - now)
+                if wait <= 0:
+                    self._calls.append(now)
+                    return self
+                await asyncio.sleep(wait)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def iter_pdf_files(folder):
+    """
+    Yield PDF files under folder depth-first (same order as Path.glob("**/*.pdf")),
+    using os.scandir so directory entries are not stat'ed one Path at a time.
+    """
+    subdirs = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif entry.name.endswith('.pdf'):
+                yield Path(entry.path)
+    for subdir in subdirs:
+        yield from iter_pdf_files(subdir)
+
 
 def get_sample_files(y67_path: Path, samples_per_company: int = 2) -> list:
     """
@@ -52,15 +104,20 @@ def get_sample_files(y67_path: Path, samples_per_company: int = 2) -> list:
     print(f"Found {len(company_folders)} company folders")
 
     for company_folder in sorted(company_folders):
-        # Search recursively for PDFs (they're in year subfolders like Y67/)
-        pdf_files = list(company_folder.glob("**/*.pdf"))
-        if pdf_files:
-            # Prefer Y67 folder if available, otherwise take first N files
-            y67_files = [f for f in pdf_files if '/Y67/' in str(f)]
-            if y67_files:
-                selected = y67_files[:samples_per_company]
-            else:
-                selected = pdf_files[:samples_per_company]
+        # Prefer the Y67 year folder if available: read just the first N files from it
+        selected = []
+        y67_folder = company_folder / "Y67"
+        if y67_folder.is_dir():
+            selected = list(islice(iter_pdf_files(y67_folder), samples_per_company))
+
+        if not selected:
+            # Otherwise search the whole company folder (PDFs are in year subfolders),
+            # still preferring Y67 folders nested further down
+            pdf_files = list(iter_pdf_files(company_folder))
+            y67_files = [f for f in pdf_files if 'Y67' in f.relative_to(company_folder).parts[:-1]]
+            selected = (y67_files or pdf_files)[:samples_per_company]
+
+        if selected:
             sample_files.extend(selected)
             print(f"  {company_folder.name[:40]}...: {len(selected)} files selected")
 
@@ -105,15 +162,17 @@ def run_ocr_test(pdf_path: Path, output_dir: Path) -> dict:
             md_filename = pdf_path.stem + "_ocr.md"
             md_path = output_dir / md_filename
 
-            # Write individual markdown file
-            with open(md_path, 'w', encoding='utf-8') as f:
-                f.write(f"# OCR Result: {pdf_path.name}\n\n")
-                f.write(f"**Source:** {pdf_path}\n")
-                f.write(f"**Company:** {result['company']}\n")
-                f.write(f"**Processed:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"**Model:** typhoon-ocr v1.5\n\n")
-                f.write("---\n\n")
-                f.write(markdown_text)
+            # Write individual markdown file in one call
+            md_path.write_text(
+                f"# OCR Result: {pdf_path.name}\n\n"
+                f"**Source:** {pdf_path}\n"
+                f"**Company:** {result['company']}\n"
+                f"**Processed:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"**Model:** typhoon-ocr v1.5\n\n"
+                "---\n\n"
+                f"{markdown_text}",
+                encoding='utf-8'
+            )
 
             result['output_file'] = str(md_path)
 
@@ -125,6 +184,29 @@ def run_ocr_test(pdf_path: Path, output_dir: Path) -> dict:
     return result
 
 
+async def run_ocr_tests(sample_files: list, output_dir: Path) -> list:
+    """
+    Run run_ocr_test on every file, overlapping requests as far as the rate
+    limits allow. The blocking OCR call and markdown write run in worker threads.
+    Returns results in the same order as sample_files.
+    """
+    limiter = RateLimiter()
+    total = len(sample_files)
+
+    async def process(i: int, pdf_path: Path) -> dict:
+        async with limiter:
+            print(f"[{i}/{total}] Processing: {pdf_path.parent.name}/{pdf_path.name}")
+        result = await asyncio.to_thread(run_ocr_test, pdf_path, output_dir)
+
+        if result['success']:
+            print(f"  ✓ [{i}/{total}] {result['char_count']:,} chars in {result['time_seconds']}s → {Path(result['output_file']).name}")
+        else:
+            print(f"  ✗ [{i}/{total}] Failed: {result['error'][:50]}...")
+        return result
+
+    return await asyncio.gather(*(process(i, p) for i, p in enumerate(sample_files, 1)))
+
+
 def generate_markdown_report(results: list, output_path: Path):
     """
     Generate markdown report from OCR results.
@@ -147,81 +229,60 @@ def generate_markdown_report(results: list, output_path: Path):
             by_company[company] = []
         by_company[company].append(r)
 
-    # Generate report
-    lines = [
-        "# Typhoon OCR Test Results",
-        "",
-        f"**Date:** {timestamp}",
-        f"**Model:** typhoon-ocr (v1.5, 2B parameters)",
-        f"**Source:** Y67 Thai Financial Documents",
-        "",
-        "---",
-        "",
-        "## Summary Statistics",
-        "",
-        f"| Metric | Value |",
-        f"|--------|-------|",
-        f"| Total Files Tested | {total} |",
-        f"| Successful | {successful} ({100*successful/total:.1f}%) |",
-        f"| Failed | {failed} |",
-        f"| Total Characters Extracted | {total_chars:,} |",
-        f"| Total Processing Time | {total_time:.1f}s |",
-        f"| Average Time per File | {avg_time:.2f}s |",
-        "",
-        "---",
-        "",
-        "## Results by Company",
-        "",
-    ]
-
-    for company, company_results in sorted(by_company.items()):
-        lines.append(f"### {company}")
-        lines.append("")
-
-        for r in company_results:
-            status = "✅" if r['success'] else "❌"
-            lines.append(f"#### {status} {r['file']}")
-            lines.append("")
-            lines.append(f"- **Processing Time:** {r['time_seconds']}s")
-            lines.append(f"- **Characters Extracted:** {r['char_count']:,}")
-
+    # Write the report straight to the file instead of building it in memory
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w', encoding='utf-8', buffering=1 << 20) as f:
+        w = f.write
+        w("# Typhoon OCR Test Results\n\n")
+        w(f"**Date:** {timestamp}\n")
+        w(f"**Model:** typhoon-ocr (v1.5, 2B parameters)\n")
+        w(f"**Source:** Y67 Thai Financial Documents\n\n")
+        w("---\n\n")
+        w("## Summary Statistics\n\n")
+        w(f"| Metric | Value |\n")
+        w(f"|--------|-------|\n")
+        w(f"| Total Files Tested | {total} |\n")
+        w(f"| Successful | {successful} ({100*successful/total:.1f}%) |\n")
+        w(f"| Failed | {failed} |\n")
+        w(f"| Total Characters Extracted | {total_chars:,} |\n")
+        w(f"| Total Processing Time | {total_time:.1f}s |\n")
+        w(f"| Average Time per File | {avg_time:.2f}s |\n\n")
+        w("---\n\n")
+        w("## Results by Company\n\n")
+
+        for company, company_results in sorted(by_company.items()):
+            w(f"### {company}\n\n")
+
+            for r in company_results:
+                status = "✅" if r['success'] else "❌"
+                w(f"#### {status} {r['file']}\n\n")
+                w(f"- **Processing Time:** {r['time_seconds']}s\n")
+                w(f"- **Characters Extracted:** {r['char_count']:,}\n")
+
+                if r['success'] and r['text']:
+                    # Show preview of extracted text (first 500 chars)
+                    w("\n**Extracted Text Preview:**\n```\n")
+                    w(r['text'][:500])
+                    if len(r['text']) > 500:
+                        w("...")
+                    w("\n```\n")
+                elif r['error']:
+                    w(f"- **Error:** {r['error']}\n")
+
+                w("\n")
+
+        # Add full OCR outputs section
+        w("---\n\n")
+        w("## Full OCR Outputs\n\n")
+        w("Complete OCR results for each successfully processed file.\n")
+
+        for r in results:
             if r['success'] and r['text']:
-                # Show preview of extracted text (first 500 chars)
-                preview = r['text'][:500]
-                if len(r['text']) > 500:
-                    preview += "..."
-                lines.append("")
-                lines.append("**Extracted Text Preview:**")
-                lines.append("```")
-                lines.append(preview)
-                lines.append("```")
-            elif r['error']:
-                lines.append(f"- **Error:** {r['error']}")
-
-            lines.append("")
-
-    # Add full OCR outputs section
-    lines.extend([
-        "---",
-        "",
-        "## Full OCR Outputs",
-        "",
-        "Complete OCR results for each successfully processed file.",
-        "",
-    ])
+                w(f"\n### {r['folder']} / {r['file']}\n\n")
+                w("```markdown\n")
+                w(r['text'])
+                w("\n```\n")
 
-    for r in results:
-        if r['success'] and r['text']:
-            lines.append(f"### {r['folder']} / {r['file']}")
-            lines.append("")
-            lines.append("```markdown")
-            lines.append(r['text'])
-            lines.append("```")
-            lines.append("")
-
-    # Write report
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text('\n'.join(lines), encoding='utf-8')
     print(f"\n✓ Report saved to: {output_path}")
 
 
@@ -252,26 +313,12 @@ def main():
         sys.exit(1)
 
     print(f"\nTotal files to test: {len(sample_files)}")
-    print(f"Estimated time: ~{len(sample_files) * 5}s (with rate limiting)")
+    per_minute = RATE_LIMITS[-1][0]
+    print(f"Estimated time: ~{(len(sample_files) - 1) // per_minute * 60 + 5}s (with rate limiting)")
     print()
 
-    # Run OCR tests with rate limiting
-    results = []
-    for i, pdf_path in enumerate(sample_files, 1):
-        print(f"[{i}/{len(sample_files)}] Processing: {pdf_path.parent.name}/{pdf_path.name}")
-
-        result = run_ocr_test(pdf_path, output_dir)
-        results.append(result)
-
-        if result['success']:
-            print(f"  ✓ {result['char_count']:,} chars in {result['time_seconds']}s → {Path(result['output_file']).name}")
-        else:
-            print(f"  ✗ Failed: {result['error'][:50]}...")
-
-        # Rate limiting: wait between requests (2 req/s max, 20 req/min)
-        if i < len(sample_files):
-            # Wait 3 seconds between requests to be safe with rate limits
-            time.sleep(3)
+    # Run OCR tests concurrently, throttled to the API rate limits
+    results = asyncio.run(run_ocr_tests(sample_files, output_dir))
 
     # Generate summary report
     print("\nGenerating summary report...")
@@ -2,6 +2,7 @@
 """
 Verify the data layer file structure without running the code.
 """
+import mmap
 import sys
 from pathlib import Path
 
@@ -23,13 +24,19 @@ def check_content(file_path: Path, required_strings: list[str]) -> bool:
     if not file_path.exists():
         return False
 
-    content = file_path.read_text()
-    all_found = all(s in content for s in required_strings)
+    # Search the mapped bytes directly instead of decoding the whole file;
+    # mmap cannot map an empty file, so that case has nothing to find
+    with open(file_path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            missing = list(required_strings)
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                missing = [s for s in required_strings if mm.find(s.encode('utf-8')) == -1]
+    all_found = not missing
 
     if all_found:
         print(f"  ✓ Contains required content: {', '.join(required_strings[:3])}...")
     else:
-        missing = [s for s in required_strings if s not in content]
         print(f"  ✗ Missing: {', '.join(missing[:3])}...")
 
     return all_found
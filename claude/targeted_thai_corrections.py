@@ -8,188 +8,244 @@ for the exact Thai OCR errors that were missed in the initial analysis.
 
 import sqlite3
 import json
+import re
+from collections import Counter
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterator, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+from scripts._db import tune_connection
+
+# Correction fields written to thai_ocr_corrections, in the upsert's VALUES order
+WRITE_FIELDS = (
+    'error_pattern', 'correction', 'confidence', 'frequency',
+    'type', 'description', 'example', 'priority'
+)
+
+# The user's example OCR output that test_corrections_on_example runs against
+EXAMPLE_TEXT = """## บริษัท สโตเรจซิสเต็ม อินดัสตรี จำกัด STORAGE SYSTEM INDUSTRY CO.,LTD.
+
+<!-- image -->
+
+## Income Statement (Amount) งบปี
+
+Printed Date: 1 July 2025
+
+|                                                         | 31/12/2567                             | 31/12/2566                             | 31/12/2565                             | 31/12/2564                             | 31/12/2563                             |
+|---------------------------------------------------------|----------------------------------------|----------------------------------------|----------------------------------------|----------------------------------------|----------------------------------------|
+| งบกําไรขาดทุน ( งบสรุป ): งบบริษัท                      | ผู้ตรวจสอบบัญชี : จันทร์เพ็ญ เตชะกําธร | ผู้ตรวจสอบบัญชี : จันทร์เพ็ญ เตชะกําธร | ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร | ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร |
+|                                                         | 31/05/2568                             | 31/05/2567                             | 29/05/2566                             | 31/05/2565                             | 30/06/2564                             |
+| รายได้จากการขายและบริการ - สุทธิ                       | 128,349,359.21                         | 152,735,117.92                         | 164,742,424.86                         | 102,897,786.40                         | 138,078,637.50                         |
+"""
 
 
 class TargetedThaiCorrectionGenerator:
     """Generate targeted corrections for specific Thai OCR errors"""
 
+    # Targeted corrections based on user's example and findings
+    TARGETED_CORRECTIONS = [
+        # Critical spacing errors from user example
+        {
+            'error_pattern': 'งบบริษัท',
+            'correction': 'งบบริษัท',
+            'confidence': 0.99,
+            'frequency': 170,  # From original analysis
+            'type': 'spacing_error',
+            'description': 'Fix spacing in financial statement term',
+            'example': 'รายไดจากการขายและบริการ - สุทธิ',
+            'priority': 'critical',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'จันทร์เพ็ญ',
+            'correction': 'จันทร์เพ็ญ',
+            'confidence': 0.95,
+            'frequency': 456,  # From original analysis
+            'type': 'name_corruption',
+            'description': 'Fix Thai name corruption',
+            'example': 'ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร',
+            'priority': 'high',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'เตชะกําธร',
+            'correction': 'เตชะกําธร',
+            'confidence': 0.95,
+            'frequency': 49,  # From original analysis
+            'type': 'name_corruption',
+            'description': 'Fix Thai name corruption',
+            'example': 'ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร',
+            'priority': 'high',
+            'user_example': True
+        },
+
+        # Character corruption patterns (ำ character)
+        {
+            'error_pattern': 'จํากัด',
+            'correction': 'จำกัด',
+            'confidence': 0.98,
+            'frequency': 58,  # From enhanced analysis
+            'type': 'character_corruption',
+            'description': 'Fix corrupted ำ character in company type',
+            'example': 'บริษัทจํากัด → บริษัทจำกัด',
+            'priority': 'critical',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'กําไร',
+            'correction': 'กำไร',
+            'confidence': 0.98,
+            'frequency': 149,  # From original analysis
+            'type': 'character_corruption',
+            'description': 'Fix corrupted ำ character in financial term',
+            'example': 'งบกําไรขาดทุน → งบกำไรขาดทุน',
+            'priority': 'critical',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'คํานวณ',
+            'correction': 'คำนวณ',
+            'confidence': 0.98,
+            'frequency': 0,  # Low frequency but critical
+            'type': 'character_corruption',
+            'description': 'Fix corrupted ำ character in calculation term',
+            'example': 'คํานวณงบกระแสเงินสด → คำนวณงบกระแสเงินสด',
+            'priority': 'high',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'จํานวนปี',
+            'correction': 'จำนวนปี',
+            'confidence': 0.98,
+            'frequency': 1,
+            'type': 'character_corruption',
+            'description': 'Fix corrupted ำ character in time period term',
+            'example': 'จํานวนปีทีดำเนินกิจการ → จำนวนปีทีดำเนินกิจการ',
+            'priority': 'high',
+            'user_example': True
+        },
+
+        # spacing and formatting errors
+        {
+            'error_pattern': r'บริษัท\s+จำกัด',
+            'correction': 'บริษัทจำกัด',
+            'confidence': 0.95,
+            'frequency': 37,  # From enhanced analysis
+            'type': 'spacing_error',
+            'description': 'Remove unnecessary space between company type and status',
+            'example': 'บริษัท จำกัด → บริษัทจำกัด',
+            'priority': 'high',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'สุทธิ',
+            'correction': 'สุทธิ',
+            'confidence': 0.85,
+            'frequency': 11,  # From enhanced analysis
+            'type': 'spacing_error',
+            'description': 'Fix spacing in financial result term',
+            'example': 'รายไดจากการขายและบริการ - สุทธิ',
+            'priority': 'medium',
+            'user_example': True
+        },
+        {
+            'error_pattern': 'ขาดทุน',
+            'correction': 'ขาดทุน',
+            'confidence': 0.90,
+            'frequency': 150,  # From original analysis
+            'type': 'spacing_error',
+            'description': 'Fix spacing in net loss term',
+            'example': 'กําไร (ขาดทุน) → กำไร (ขาดทุน)',
+            'priority': 'medium',
+            'user_example': True
+        },
+
+        # Mixed Thai-English punctuation
+        {
+            'error_pattern': 'COMPANY.,LTD.',
+            'correction': 'COMPANY LTD',
+            'confidence': 0.95,
+            'frequency': 0,  # Pattern-based
+            'type': 'mixed_punctuation',
+            'description': 'Fix English punctuation in company name',
+            'example': 'STORAGE SYSTEM INDUSTRY CO.,LTD. → STORAGE SYSTEM INDUSTRY CO LTD',
+            'priority': 'medium',
+            'user_example': True
+        }
+    ]
+
+    # (compiled alternation, pattern -> correction map, automaton or None),
+    # built once per process
+    _pattern_table = None
+
+    @classmethod
+    def _build_pattern_table(cls) -> Tuple[re.Pattern, Dict[str, str], object]:
+        """Compile every error pattern into one longest-first alternation
+
+        Patterns are matched literally, the same way the dictionary page looks
+        them up, so applying the whole table is a single scan of the text.
+        When pyahocorasick is installed an automaton over the same patterns is
+        built too, which stays linear in the text however many patterns there are.
+        """
+        if cls._pattern_table is None:
+            literal_map = {}
+            for correction in cls.TARGETED_CORRECTIONS:
+                literal_map.setdefault(correction['error_pattern'], correction['correction'])
+            compiled = re.compile("|".join(
+                re.escape(pattern) for pattern in sorted(literal_map, key=len, reverse=True)
+            ))
+
+            automaton = None
+            if AHOCORASICK_AVAILABLE:
+                automaton = ahocorasick.Automaton()
+                for pattern in literal_map:
+                    automaton.add_word(pattern, (len(pattern), pattern))
+                automaton.make_automaton()
+
+            cls._pattern_table = (compiled, literal_map, automaton)
+        return cls._pattern_table
+
     def __init__(self, db_path: str = "data/prototype.db"):
         self.db_path = db_path
         self.conn = None
         self.cursor = None
 
-        # Targeted corrections based on user's example and findings
-        self.targeted_corrections = [
-            # Critical spacing errors from user example
-            {
-                'error_pattern': 'งบบริษัท',
-                'correction': 'งบบริษัท',
-                'confidence': 0.99,
-                'frequency': 170,  # From original analysis
-                'type': 'spacing_error',
-                'description': 'Fix spacing in financial statement term',
-                'example': 'รายไดจากการขายและบริการ - สุทธิ',
-                'priority': 'critical',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'จันทร์เพ็ญ',
-                'correction': 'จันทร์เพ็ญ',
-                'confidence': 0.95,
-                'frequency': 456,  # From original analysis
-                'type': 'name_corruption',
-                'description': 'Fix Thai name corruption',
-                'example': 'ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร',
-                'priority': 'high',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'เตชะกําธร',
-                'correction': 'เตชะกําธร',
-                'confidence': 0.95,
-                'frequency': 49,  # From original analysis
-                'type': 'name_corruption',
-                'description': 'Fix Thai name corruption',
-                'example': 'ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร',
-                'priority': 'high',
-                'user_example': True
-            },
-
-            # Character corruption patterns (ำ character)
-            {
-                'error_pattern': 'จํากัด',
-                'correction': 'จำกัด',
-                'confidence': 0.98,
-                'frequency': 58,  # From enhanced analysis
-                'type': 'character_corruption',
-                'description': 'Fix corrupted ำ character in company type',
-                'example': 'บริษัทจํากัด → บริษัทจำกัด',
-                'priority': 'critical',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'กําไร',
-                'correction': 'กำไร',
-                'confidence': 0.98,
-                'frequency': 149,  # From original analysis
-                'type': 'character_corruption',
-                'description': 'Fix corrupted ำ character in financial term',
-                'example': 'งบกําไรขาดทุน → งบกำไรขาดทุน',
-                'priority': 'critical',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'คํานวณ',
-                'correction': 'คำนวณ',
-                'confidence': 0.98,
-                'frequency': 0,  # Low frequency but critical
-                'type': 'character_corruption',
-                'description': 'Fix corrupted ำ character in calculation term',
-                'example': 'คํานวณงบกระแสเงินสด → คำนวณงบกระแสเงินสด',
-                'priority': 'high',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'จํานวนปี',
-                'correction': 'จำนวนปี',
-                'confidence': 0.98,
-                'frequency': 1,
-                'type': 'character_corruption',
-                'description': 'Fix corrupted ำ character in time period term',
-                'example': 'จํานวนปีทีดำเนินกิจการ → จำนวนปีทีดำเนินกิจการ',
-                'priority': 'high',
-                'user_example': True
-            },
-
-            # spacing and formatting errors
-            {
-                'error_pattern': r'บริษัท\s+จำกัด',
-                'correction': 'บริษัทจำกัด',
-                'confidence': 0.95,
-                'frequency': 37,  # From enhanced analysis
-                'type': 'spacing_error',
-                'description': 'Remove unnecessary space between company type and status',
-                'example': 'บริษัท จำกัด → บริษัทจำกัด',
-                'priority': 'high',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'สุทธิ',
-                'correction': 'สุทธิ',
-                'confidence': 0.85,
-                'frequency': 11,  # From enhanced analysis
-                'type': 'spacing_error',
-                'description': 'Fix spacing in financial result term',
-                'example': 'รายไดจากการขายและบริการ - สุทธิ',
-                'priority': 'medium',
-                'user_example': True
-            },
-            {
-                'error_pattern': 'ขาดทุน',
-                'correction': 'ขาดทุน',
-                'confidence': 0.90,
-                'frequency': 150,  # From original analysis
-                'type': 'spacing_error',
-                'description': 'Fix spacing in net loss term',
-                'example': 'กําไร (ขาดทุน) → กำไร (ขาดทุน)',
-                'priority': 'medium',
-                'user_example': True
-            },
-
-            # Mixed Thai-English punctuation
-            {
-                'error_pattern': 'COMPANY.,LTD.',
-                'correction': 'COMPANY LTD',
-                'confidence': 0.95,
-                'frequency': 0,  # Pattern-based
-                'type': 'mixed_punctuation',
-                'description': 'Fix English punctuation in company name',
-                'example': 'STORAGE SYSTEM INDUSTRY CO.,LTD. → STORAGE SYSTEM INDUSTRY CO LTD',
-                'priority': 'medium',
-                'user_example': True
-            }
-        ]
+        self.targeted_corrections = self.TARGETED_CORRECTIONS
+
+        # Column-wise copy of the written fields, so the write path binds rows
+        # straight from zip() instead of looking up keys in every dict
+        self._write_columns = tuple(
+            [correction[field] for correction in self.targeted_corrections]
+            for field in WRITE_FIELDS
+        )
 
     def connect(self) -> bool:
         """Connect to database"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # WAL + synchronous=NORMAL for the correction writes; wait on a busy
+            # database instead of failing while another script holds the lock
+            self.conn = tune_connection(sqlite3.connect(self.db_path, timeout=60))
             self.cursor = self.conn.cursor()
+
+            # journal_mode=WAL silently stays on the old mode where WAL is unsupported
+            journal_mode = self.cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode != 'wal':
+                print(f"⚠️ WAL not available, using journal_mode={journal_mode}")
             return True
         except Exception as e:
             print(f"Error connecting to database: {e}")
             return False
 
-    def check_existing_corrections(self) -> Dict:
-        """Check what corrections already exist"""
-        if not self.cursor:
-            return {}
-
-        try:
-            self.cursor.execute("""
-                SELECT error_pattern, correction FROM thai_ocr_corrections
-                WHERE is_active = 1
-            """)
-
-            existing = {}
-            for row in self.cursor.fetchall():
-                key = f"{row[0]}->{row[1]}"
-                existing[key] = True
-
-            return existing
-
-        except Exception as e:
-            print(f"Error checking existing corrections: {e}")
-            return {}
-
     def add_targeted_corrections(self) -> Dict:
         """Add targeted corrections to database"""
         if not self.connect():
             return {}
 
-        existing_corrections = self.check_existing_corrections()
         results = {
             'added': [],
             'skipped': [],
@@ -197,128 +253,165 @@ class TargetedThaiCorrectionGenerator:
         }
 
         try:
-            for correction in self.targeted_corrections:
-                key = f"{correction['error_pattern']}->{correction['correction']}"
-
-                if key in existing_corrections:
-                    # Update existing correction
-                    self.cursor.execute("""
-                        UPDATE thai_ocr_corrections
-                        SET confidence = ?, frequency = ?, type = ?, description = ?,
-                            example = ?, priority = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE error_pattern = ? AND correction = ?
-                    """, (
-                        correction['confidence'],
-                        correction['frequency'],
-                        correction['type'],
-                        correction['description'],
-                        correction['example'],
-                        correction['priority'],
-                        correction['error_pattern'],
-                        correction['correction']
-                    ))
-                    results['updated'].append(key)
-                else:
-                    # Add new correction
-                    self.cursor.execute("""
-                        INSERT INTO thai_ocr_corrections
-                        (error_pattern, correction, confidence, frequency, type, description,
-                         example, priority, created_at, updated_at, is_active)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
-                    """, (
-                        correction['error_pattern'],
-                        correction['correction'],
-                        correction['confidence'],
-                        correction['frequency'],
-                        correction['type'],
-                        correction['description'],
-                        correction['example'],
-                        correction['priority']
-                    ))
+            self.cursor.execute("BEGIN IMMEDIATE")
+
+            # Covering index for the readers that load every active pair; the
+            # upsert itself is served by the UNIQUE(error_pattern, correction) index
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_thai_ocr_corrections_active_pair
+                ON thai_ocr_corrections(is_active, error_pattern, correction)
+            """)
+
+            # Rows inserted below get ids above the current maximum, which is
+            # how added and updated pairs are told apart afterwards
+            self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM thai_ocr_corrections")
+            last_id = self.cursor.fetchone()[0]
+
+            # Insert new corrections and refresh existing ones in one statement,
+            # keyed on the table's UNIQUE(error_pattern, correction)
+            self.cursor.executemany("""
+                INSERT INTO thai_ocr_corrections
+                (error_pattern, correction, confidence, frequency, type, description,
+                 example, priority, created_at, updated_at, is_active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
+                ON CONFLICT(error_pattern, correction) DO UPDATE SET
+                    confidence = excluded.confidence,
+                    frequency = excluded.frequency,
+                    type = excluded.type,
+                    description = excluded.description,
+                    example = excluded.example,
+                    priority = excluded.priority,
+                    updated_at = CURRENT_TIMESTAMP
+            """, zip(*self._write_columns))
+
+            self.cursor.execute(
+                "SELECT error_pattern, correction FROM thai_ocr_corrections WHERE id > ?",
+                (last_id,)
+            )
+            added = {(pattern, correction) for pattern, correction in self.cursor.fetchall()}
+
+            patterns, corrections = self._write_columns[:2]
+            for pattern, correction in zip(patterns, corrections):
+                key = f"{pattern}->{correction}"
+                if (pattern, correction) in added:
                     results['added'].append(key)
+                else:
+                    results['updated'].append(key)
 
             self.conn.commit()
             print(f"✅ Database updated: {len(results['added'])} added, {len(results['updated'])} updated")
 
+            # Refresh the planner statistics once the table has grown
+            if results['added']:
+                self.cursor.execute("ANALYZE thai_ocr_corrections")
+
         except Exception as e:
             print(f"❌ Error adding corrections: {e}")
             self.conn.rollback()
 
         return results
 
-    def generate_user_focused_report(self) -> str:
-        """Generate report focused on user-identified errors"""
-        user_examples = [c for c in self.targeted_corrections if c.get('user_example', False)]
-
-        report_lines = []
-        report_lines.append("# User-Focused Thai OCR Corrections Report")
-        report_lines.append("=" * 50)
-        report_lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        report_lines.append(f"Targeted corrections based on user feedback")
-        report_lines.append(f"Total targeted corrections: {len(user_examples)}")
-        report_lines.append("")
-
-        report_lines.append("## 🎯 Critical User-Identified Errors")
-        report_lines.append("")
-
-        for i, correction in enumerate(user_examples, 1):
+    def _iter_report_lines(self) -> Iterator[str]:
+        """Yield the user-focused report line by line, each ending in a newline"""
+        # One pass over the corrections sorts the user examples by priority;
+        # critical entries keep their position among all user examples
+        user_example_count = 0
+        critical = []
+        high = []
+        for correction in self.targeted_corrections:
+            if not correction.get('user_example', False):
+                continue
+            user_example_count += 1
             if correction['priority'] == 'critical':
-                report_lines.append(f"{i}. **{correction['error_pattern']}** → **{correction['correction']}**")
-                report_lines.append(f"   - **Type**: {correction['type']}")
-                report_lines.append(f"   - **Confidence**: {correction['confidence']:.2f}")
-                report_lines.append(f"   - **Example**: {correction['example']}")
-                report_lines.append("")
-
-        report_lines.append("")
-        report_lines.append("## 📋 High Priority Errors")
-        report_lines.append("")
-
-        for i, correction in enumerate([c for c in user_examples if c['priority'] == 'high'], 1):
-            report_lines.append(f"{i}. **{correction['error_pattern']}** → **{correction['correction']}**")
-            report_lines.append(f"   - **Type**: {correction['type']}")
-            report_lines.append(f"   - **Example**: {correction['example']}")
-            report_lines.append("")
+                critical.append((user_example_count, correction))
+            elif correction['priority'] == 'high':
+                high.append(correction)
+
+        yield "# User-Focused Thai OCR Corrections Report\n"
+        yield "=" * 50 + "\n"
+        yield f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        yield f"Targeted corrections based on user feedback\n"
+        yield f"Total targeted corrections: {user_example_count}\n"
+        yield "\n"
+
+        yield "## 🎯 Critical User-Identified Errors\n"
+        yield "\n"
+
+        for i, correction in critical:
+            yield f"{i}. **{correction['error_pattern']}** → **{correction['correction']}**\n"
+            yield f"   - **Type**: {correction['type']}\n"
+            yield f"   - **Confidence**: {correction['confidence']:.2f}\n"
+            yield f"   - **Example**: {correction['example']}\n"
+            yield "\n"
+
+        yield "\n"
+        yield "## 📋 High Priority Errors\n"
+
+        # The blank line goes before each entry so the file ends right after
+        # the last one
+        for i, correction in enumerate(high, 1):
+            yield "\n"
+            yield f"{i}. **{correction['error_pattern']}** → **{correction['correction']}**\n"
+            yield f"   - **Type**: {correction['type']}\n"
+            yield f"   - **Example**: {correction['example']}\n"
 
-        return '\n'.join(report_lines)
+    def generate_user_focused_report(self) -> str:
+        """Generate report focused on user-identified errors"""
+        return "".join(self._iter_report_lines())
+
+    def apply_corrections(self, text: str) -> Tuple[str, Counter]:
+        """Apply every targeted correction to text in a single pass
+
+        Returns the corrected text and how many times each error pattern was found.
+        """
+        compiled, literal_map, automaton = self._build_pattern_table()
+        found_counts = Counter()
+
+        if automaton is not None:
+            # Keep the leftmost-longest non-overlapping matches, the same ones
+            # the longest-first alternation picks
+            matches = sorted(
+                (end - length + 1, -length, pattern)
+                for end, (length, pattern) in automaton.iter(text)
+            )
+            parts = []
+            position = 0
+            for start, negative_length, pattern in matches:
+                if start < position:
+                    continue
+                parts.append(text[position:start])
+                parts.append(literal_map[pattern])
+                found_counts[pattern] += 1
+                position = start - negative_length
+            parts.append(text[position:])
+            return "".join(parts), found_counts
+
+        def replace(match):
+            pattern = match.group(0)
+            found_counts[pattern] += 1
+            return literal_map[pattern]
+
+        return compiled.sub(replace, text), found_counts
 
     def test_corrections_on_example(self) -> Dict:
         """Test corrections on the user's specific example text"""
-        example_text = """## บริษัท สโตเรจซิสเต็ม อินดัสตรี จำกัด STORAGE SYSTEM INDUSTRY CO.,LTD.
-
-<!-- image -->
-
-## Income Statement (Amount) งบปี
-
-Printed Date: 1 July 2025
-
-|                                                         | 31/12/2567                             | 31/12/2566                             | 31/12/2565                             | 31/12/2564                             | 31/12/2563                             |
-|---------------------------------------------------------|----------------------------------------|----------------------------------------|----------------------------------------|----------------------------------------|----------------------------------------|
-| งบกําไรขาดทุน ( งบสรุป ): งบบริษัท                      | ผู้ตรวจสอบบัญชี : จันทร์เพ็ญ เตชะกําธร | ผู้ตรวจสอบบัญชี : จันทร์เพ็ญ เตชะกําธร | ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร | ผู้ตรวจสอบัญชี : จันทร์เพ็ญ เตชะกําธร |
-|                                                         | 31/05/2568                             | 31/05/2567                             | 29/05/2566                             | 31/05/2565                             | 30/06/2564                             |
-| รายได้จากการขายและบริการ - สุทธิ                       | 128,349,359.21                         | 152,735,117.92                         | 164,742,424.86                         | 102,897,786.40                         | 138,078,637.50                         |
-"""
 
         test_results = {
             'original_errors': [],
             'corrections_applied': [],
-            'final_text': example_text
+            'final_text': EXAMPLE_TEXT
         }
 
-        # Apply corrections and track changes
-        corrected_text = example_text
+        corrected_text, found_counts = self.apply_corrections(EXAMPLE_TEXT)
         for correction in self.targeted_corrections:
-            if correction['error_pattern'] in corrected_text:
+            pattern = correction['error_pattern']
+            if found_counts[pattern]:
                 test_results['original_errors'].append({
-                    'pattern': correction['error_pattern'],
+                    'pattern': pattern,
                     'found': True,
-                    'count': corrected_text.count(correction['error_pattern'])
+                    'count': found_counts[pattern]
                 })
-
-                corrected_text = corrected_text.replace(
-                    correction['error_pattern'],
-                    correction['correction']
-                )
-                test_results['corrections_applied'].append(correction['error_pattern'])
+                test_results['corrections_applied'].append(pattern)
 
         test_results['final_text'] = corrected_text
         return test_results
@@ -336,10 +429,9 @@ Printed Date: 1 July 2025
         # Add corrections to database
         results = self.add_targeted_corrections()
 
-        # Generate user-focused report
-        report = self.generate_user_focused_report()
+        # Generate user-focused report, streaming it straight into the file
         with open('targeted_thai_corrections_report.md', 'w', encoding='utf-8') as f:
-            f.write(report)
+            f.writelines(self._iter_report_lines())
         print("💾 User-focused report saved to targeted_thai_corrections_report.md")
 
         # Test corrections on user's example
@@ -356,7 +448,7 @@ Printed Date: 1 July 2025
 
         # Show preview of first few lines after correction
         print("\n📋 Preview after corrections (first 3 lines):")
-        lines = test_results['final_text'].split('\n')[:3]
+        lines = test_results['final_text'].split('\n', 3)[:3]
         for line in lines:
             print(f"   {line}")
 
@@ -241,6 +241,64 @@ def test_directory_scan():
         print("  This is expected if Y67 folder is not available")
 
 
+def test_phrase_dashboard_counts():
+    """Test the single-pass dashboard counts against separate COUNT queries"""
+    print("\n" + "=" * 60)
+    print("Testing Phrase Dashboard Counts")
+    print("=" * 60)
+
+    import sqlite3
+    import tempfile
+
+    from app.config import config
+    from app.thai_phrase_integration import get_phrase_count_for_dashboard
+
+    original_root = config.PROJECT_ROOT
+    with tempfile.TemporaryDirectory() as tmp:
+        config.PROJECT_ROOT = Path(tmp)
+        try:
+            config.DATABASE_PATH.parent.mkdir(parents=True)
+            conn = sqlite3.connect(config.DATABASE_PATH)
+            conn.execute('''
+                CREATE TABLE thai_phrases (
+                    id INTEGER PRIMARY KEY, phrase TEXT, status TEXT, needs_correction BOOLEAN
+                )
+            ''')
+            conn.executemany(
+                'INSERT INTO thai_phrases (phrase, status, needs_correction) VALUES (?, ?, ?)',
+                [
+                    ('บริษัท', 'pending', True),
+                    ('จำกัด', 'pending', False),
+                    ('งบดุล', 'reviewed', True),
+                    ('รายได้', 'corrected', None),
+                    ('กำไร', None, False),
+                ]
+            )
+            conn.commit()
+
+            # The three queries the dashboard used to run
+            total = conn.execute('SELECT COUNT(*) FROM thai_phrases').fetchone()[0]
+            needs_review = conn.execute(
+                'SELECT COUNT(*) FROM thai_phrases WHERE needs_correction = TRUE'
+            ).fetchone()[0]
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM thai_phrases WHERE status = 'pending'"
+            ).fetchone()[0]
+            conn.close()
+
+            stats = get_phrase_count_for_dashboard()
+            print(f"  {stats}")
+            assert 'error' not in stats, f"Dashboard query failed: {stats.get('error')}"
+            assert stats['total_phrases'] == total == 5
+            assert stats['needs_review'] == needs_review == 2
+            assert stats['pending_review'] == pending == 2
+            assert stats['review_rate'] == (total - pending) / total
+        finally:
+            config.PROJECT_ROOT = original_root
+
+    print("\n✓ Dashboard count tests passed!")
+
+
 def main():
     """Run all tests"""
     print("\n" + "=" * 60)
@@ -253,6 +311,7 @@ def main():
         test_thai_utils()
         test_parser()
         test_directory_scan()
+        test_phrase_dashboard_counts()
 
         print("\n" + "=" * 60)
         print("✅ ALL TESTS PASSED!")